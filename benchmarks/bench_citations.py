@@ -0,0 +1,136 @@
+"""
+    throughput benchmark of the manual citations, the compiled CitationFormatter against the legacy manual_citations
+
+    - the articles are parsed from fixtures/pubmed_articles.xml, and copied into thousands
+    - legacy: manual_citations as it was before the formatter, copied verbatim,
+      fed with the `author_records` as the author tuples it expected
+    - the legacy one fails on the collective authors and the articles without authors,
+      these articles are left out of both timings
+    - the outputs are not compared with the legacy one, the author rules of the styles were fixed with the formatter,
+      they are checked against the golden citations fixtures/citations_golden.jsonl before timing,
+      each line is {"pmid": ..., "fmt": ..., "expected": ...}, including an eLife article without pagination
+
+    >>> python benchmarks/bench_citations.py
+    >>> python benchmarks/bench_citations.py --copies 5000 --repeat 5
+"""
+import os
+import sys
+import json
+import time
+
+import click
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+from pypubmed.util import pubmed_xml_parser
+from pypubmed.core.article import Article
+from pypubmed.core.citations import CitationFormatter
+
+
+FIXTURE = os.path.join(BASE_DIR, 'fixtures', 'pubmed_articles.xml')
+GOLDEN = os.path.join(BASE_DIR, 'fixtures', 'citations_golden.jsonl')
+
+
+class LegacyArticle(object):
+    """
+        the article the legacy manual_citations expected: authors are [last, fore, initials] tuples
+    """
+    def __init__(self, article):
+        self.article = article
+        self.authors = article.author_records
+        self.doi = article.doi
+        self.issue = article.issue
+        self.pmc = article.pmc
+
+    def to_dict(self):
+        return self.article.to_dict()
+
+
+def legacy_manual_citations(article, fmt='ama'):
+
+    doi = ' doi:{}'.format(article.doi) if article.doi else ''
+    issue = '({})'.format(article.issue) if article.issue else ''
+
+    # ========================================
+    # # merge the pagination?
+    # # - S1-22; quiz S23-4  =>  S1-S24
+    # # - 548-554            =>  548-54
+    # ========================================
+    # pagination_merge = article.pagination
+
+    if fmt == 'ama':
+        citation = '{authors}. {title} {med_abbr}. {year};{volume}{issue}:{pagination}.{doi}'
+        if len(article.authors) > 5:
+            authors = ', '.join('{} {}'.format(author[0], author[2]) for author in article.authors[:3]) + ' et al'
+        else:
+            authors = ', '.join('{} {}'.format(author[0], author[2]) for author in article.authors)
+    elif fmt == 'mla':
+        first_author = '{}, {}'.format(*article.authors[0][:2])
+        issue = ',{}'.format(article.issue) if article.issue else ''
+        citation = '{first_author} et al. “{title}” {journal} vol. {volume}{issue} ({year}): {pagination}.{doi}'
+    elif fmt == 'apa':
+        doi = ' https://doi.org/{}'.format(article.doi) if article.doi else ''
+        author_all = ', '.join('{}, {}.'.format(each[0], '. '.join(each[2])) for each in article.authors[:-1])
+        last_author = article.authors[-1]
+        if len(last_author) == 1:
+            last_author = last_author[0]
+        else:
+            last_author = '{}, {}.'.format(last_author[0], '. '.join(last_author[2]))
+        citation = '{author_all}, & {last_author} ({year}). {title} {journal}, {volume}{issue}, {pagination}.{doi}'
+    elif fmt == 'nlm':
+        author_list = ', '.join('{} {}'.format(each[0], each[2]) if len(each) >= 3 else ';{}'.format(each[0]) for each in article.authors)
+        doi = doi + '. ' if doi else ' '
+        citation = '{author_list}. {title} {med_abbr}. {pubdate};{volume}{issue}:{pagination}.{doi}PMID:{pmid}'
+        if article.pmc:
+            citation += '; PMCID: {pmc}.'
+
+    citation = citation.format(**dict(article.to_dict(), **locals()))
+
+    return citation
+
+
+def timeit(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+@click.command()
+@click.option('--copies', help='copies of the fixture articles', type=int, default=2000, show_default=True)
+@click.option('--repeat', help='repeat times, the best is reported', type=int, default=5, show_default=True)
+def main(**kwargs):
+    with open(FIXTURE, 'rb') as f:
+        contexts = list(pubmed_xml_parser.parse(f.read()))
+
+    parsed = [Article(**context) for context in contexts]
+    supported = [a for a in parsed if a.author_records and all(len(record) == 3 for record in a.author_records)]
+    click.echo('{} of {} fixture articles supported by the legacy formatter'.format(len(supported), len(parsed)))
+
+    by_pmid = {article.pmid: article for article in parsed}
+    with open(GOLDEN) as f:
+        golden = [json.loads(line) for line in f]
+    for case in golden:
+        citation = CitationFormatter.get(case['fmt']).format(by_pmid[case['pmid']])
+        assert citation == case['expected'], 'different {} citation of {}: {!r}'.format(case['fmt'], case['pmid'], citation)
+    click.echo('golden citations: {} cases identical'.format(len(golden)))
+
+    articles = supported * kwargs['copies']
+    legacy_articles = [LegacyArticle(article) for article in articles]
+    click.echo('{} articles, {} authors on average'.format(
+        len(articles), sum(len(a.author_records) for a in articles) // len(articles)))
+
+    for fmt in CitationFormatter.styles:
+        formatter = CitationFormatter.get(fmt)
+        legacy = timeit(lambda: [(article.article.pmid, legacy_manual_citations(article, fmt)) for article in legacy_articles], kwargs['repeat'])
+        current = timeit(lambda: formatter.format_batch(articles), kwargs['repeat'])
+        click.echo('{:<4} legacy: {:>10.0f} articles/s    compiled: {:>10.0f} articles/s    speedup: {:.1f}x'.format(
+            fmt, len(articles) / legacy, len(articles) / current, legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,183 @@
+"""
+    micro-benchmark of pubmed_xml_parser.parse_article against the legacy implementation
+
+    - regular: the records of fixtures/pubmed_articles.xml
+    - consortium: a record with thousands of authors, built from the first fixture record
+
+    the outputs of both implementations are checked to be identical before timing,
+    except `author_records`, which the legacy one did not parse
+
+    >>> python benchmarks/bench_pubmed_parser.py
+    >>> python benchmarks/bench_pubmed_parser.py --authors 5000 --repeat 20
+"""
+import os
+import re
+import sys
+import copy
+import time
+import datetime
+from collections import defaultdict
+
+import click
+from lxml import etree
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+from pypubmed.util.pubmed_xml_parser import parse_article, parse_abstract
+
+
+FIXTURE = os.path.join(BASE_DIR, 'fixtures', 'pubmed_articles.xml')
+
+
+def legacy_parse_article(PubmedArticle):
+    """
+        the parser before the xpaths were compiled, kept for comparison
+    """
+    context = {}
+    MedlineCitation = PubmedArticle.find('MedlineCitation')
+    Article = MedlineCitation.find('Article')
+
+    context['pmid'] = int(MedlineCitation.findtext('PMID'))
+
+    context['e_issn'] = Article.findtext('Journal/ISSN[@IssnType="Electronic"]')
+    context['issn'] = Article.findtext('Journal/ISSN[@IssnType="Print"]') or MedlineCitation.findtext('MedlineJournalInfo/ISSNLinking')
+
+    context['journal'] = Article.findtext('Journal/Title')
+    context['iso_abbr'] = Article.findtext('Journal/ISOAbbreviation')
+
+    context['med_abbr'] = MedlineCitation.findtext('MedlineJournalInfo/MedlineTA')
+
+    context['pubdate'] = ' '.join(Article.xpath('Journal/JournalIssue/PubDate/*/text()'))
+
+    pubmed_pubdate = year = ''
+    for status in ('pubmed', 'entrez', 'medline'):
+        ymd = PubmedArticle.xpath('PubmedData/History/PubMedPubDate[@PubStatus="{}"]/*/text()'.format(status))
+        if ymd:
+            pubmed_pubdate = datetime.datetime(*map(int, ymd))
+            year = pubmed_pubdate.year
+            pubmed_pubdate = pubmed_pubdate.strftime('%Y/%m/%d')
+            break
+
+    context['year'] = year
+    context['pubmed_pubdate'] = pubmed_pubdate
+
+    context['pagination'] = Article.findtext('Pagination/MedlinePgn')
+    context['volume'] = Article.findtext('Journal/JournalIssue/Volume')
+    context['issue'] = Article.findtext('Journal/JournalIssue/Issue')
+    context['title'] = ''.join(Article.find('ArticleTitle').itertext())
+    context['keywords'] = MedlineCitation.xpath('KeywordList/Keyword/text()')
+    context['pub_status'] = PubmedArticle.findtext('PubmedData/PublicationStatus')
+
+    context['abstract'] = parse_abstract(Article.xpath('Abstract/AbstractText'))
+    
+    author_mail = []
+
+    author_list = []
+    affiliation_author_map = defaultdict(list)
+    for author in Article.xpath('AuthorList/Author'):
+
+        last_name = author.findtext('LastName')
+        fore_name = author.findtext('ForeName')
+        # Initials = author.findtext('Initials')
+
+        author_name = ' '.join(name for name in [fore_name, last_name] if name)
+
+        author_list.append(author_name)
+
+        for aff in author.xpath('AffiliationInfo/Affiliation/text()'):
+            affiliation_author_map[aff].append(author_name)
+
+        affiliation_info = '\n'.join(author.xpath('AffiliationInfo/Affiliation/text()'))
+        mail = re.findall(r'([^\s]+?@.+)\.', str(affiliation_info))
+        if mail:
+            mail = '{}: {}'.format(author_name, mail[0])
+            author_mail.append(mail)
+
+    context['author_mail'] = '\n'.join(author_mail) or '.'
+    authors = Article.xpath('AuthorList/Author/AffiliationInfo/Affiliation/text()')
+    context['author_first'] = context['author_last'] = '.'
+    if authors:
+        context['author_first'] = authors[0]
+        if len(authors) > 1:
+            context['author_last'] = authors[-1]
+
+    context['authors'] = '\n'.join(author_list)
+
+    # affiliation list
+    affiliations = Article.xpath('AuthorList/Author/AffiliationInfo/Affiliation/text()')
+
+    affiliation_unique_list = []
+    for aff in affiliations:
+        if aff not in affiliation_unique_list:
+            affiliation_unique_list.append(aff)
+
+    context['affiliations'] = '\n'.join((
+        f'{n}. {aff} - {affiliation_author_map.get(aff)}' 
+        for n, aff in enumerate(affiliation_unique_list, 1)
+    ))
+
+    context['pub_types'] = Article.xpath('PublicationTypeList/PublicationType/text()')
+    context['doi'] = PubmedArticle.findtext('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]')
+    context['pmc'] = PubmedArticle.findtext('PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]')
+
+    return context
+
+
+def consortium_article(article, authors, affiliations):
+    """
+        copy a record with `authors` authors, sharing `affiliations` distinct affiliations
+    """
+    article = copy.deepcopy(article)
+    author_list = article.find('MedlineCitation/Article/AuthorList')
+    for author in list(author_list):
+        author_list.remove(author)
+
+    for n in range(authors):
+        author = etree.SubElement(author_list, 'Author', ValidYN='Y')
+        etree.SubElement(author, 'LastName').text = 'Last{}'.format(n)
+        etree.SubElement(author, 'ForeName').text = 'Fore {}'.format(n)
+        for m in (n % affiliations, (n * 7) % affiliations):
+            info = etree.SubElement(author, 'AffiliationInfo')
+            etree.SubElement(info, 'Affiliation').text = 'Department {m}, University {m}, City, Country. lab{m}@univ{m}.edu.'.format(m=m)
+    return article
+
+
+def timeit(func, articles, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for article in articles:
+            func(article)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(articles)
+
+
+@click.command()
+@click.option('--authors', help='the number of authors of the consortium record', type=int, default=3000, show_default=True)
+@click.option('--affiliations', help='the number of distinct affiliations of the consortium record', type=int, default=500, show_default=True)
+@click.option('--repeat', help='repeat times, the best is reported', type=int, default=10, show_default=True)
+def main(**kwargs):
+    articles = etree.parse(FIXTURE).getroot().findall('PubmedArticle')
+    consortium = consortium_article(articles[0], kwargs['authors'], kwargs['affiliations'])
+
+    cases = [
+        ('regular', articles * 100, kwargs['repeat']),
+        ('consortium', [consortium], kwargs['repeat']),
+    ]
+
+    for name, elements, repeat in cases:
+        for element in elements[:len(articles)]:
+            context = parse_article(element)
+            context.pop('author_records')
+            assert context == legacy_parse_article(element), 'the outputs are different'
+
+        legacy = timeit(legacy_parse_article, elements, repeat)
+        current = timeit(parse_article, elements, repeat)
+        click.echo('{:<12} legacy: {:>10.1f} us/record    current: {:>10.1f} us/record    speedup: {:.1f}x'.format(
+            name, legacy * 1e6, current * 1e6, legacy / current))
+
+
+if __name__ == '__main__':
+    main()
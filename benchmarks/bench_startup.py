@@ -0,0 +1,86 @@
+"""
+    startup benchmark of the command line, guards against heavy imports or network calls at startup
+
+    - the wall time of some commands which should not touch the network, the median of the runs
+    - the heavy modules must not be imported by `pypubmed.bin.cli` itself
+
+    exit with 1 if a heavy module is imported, or a command is slower than --max-seconds
+
+    >>> python benchmarks/bench_startup.py
+    >>> python benchmarks/bench_startup.py --runs 10 --max-seconds 0.5
+"""
+import os
+import sys
+import json
+import time
+import statistics
+import subprocess
+
+import click
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BASE_DIR)
+
+COMMANDS = [
+    ['--help'],
+    ['--version'],
+    ['search', '--help'],
+    ['citations', '--help'],
+    ['ingest', '--help'],
+    ['update', '--help'],
+]
+
+# imported only when a subcommand needs them
+HEAVY_MODULES = [
+    'openpyxl',
+    'prettytable',
+    'googletranslatepy',
+    'impact_factor',
+    'webrequests',
+    'pyarrow',
+    'lxml',
+    'pypubmed.core.eutils',
+]
+
+
+def run(args):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.getenv('PYTHONPATH')])))
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'pypubmed.bin.cli'] + args, env=env, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def imported_heavy_modules():
+    code = 'import sys, json; import pypubmed.bin.cli; print(json.dumps([m for m in {} if m in sys.modules]))'.format(HEAVY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT_DIR, os.getenv('PYTHONPATH')])))
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return json.loads(output)
+
+
+@click.command()
+@click.option('--runs', help='the runs of each command', type=int, default=5, show_default=True)
+@click.option('--max-seconds', help='the max median seconds of each command', type=float, default=1.0, show_default=True)
+def main(**kwargs):
+    failed = False
+
+    heavy = imported_heavy_modules()
+    if heavy:
+        failed = True
+        click.secho('heavy modules imported at startup: {}'.format(', '.join(heavy)), fg='red')
+    else:
+        click.secho('no heavy module imported at startup', fg='green')
+
+    for args in COMMANDS:
+        median = statistics.median(run(args) for _ in range(kwargs['runs']))
+        slow = median > kwargs['max_seconds']
+        failed = failed or slow
+        click.secho('{:<28} {:>8.3f} s'.format('pypubmed ' + ' '.join(args), median), fg='red' if slow else 'green')
+
+    if failed:
+        exit(1)
+
+
+if __name__ == '__main__':
+    main()
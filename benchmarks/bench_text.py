@@ -0,0 +1,80 @@
+"""
+    benchmark of the abstract normalization, pypubmed.util.text.normalize against the legacy implementation
+
+    the outputs are checked against the golden corpus fixtures/abstracts_golden.jsonl before timing,
+    each line is {"input": ..., "expected": ...}, the expected output comes from the legacy implementation
+
+    >>> python benchmarks/bench_text.py
+    >>> python benchmarks/bench_text.py --repeat 20
+"""
+import os
+import re
+import sys
+import json
+import time
+
+import click
+from w3lib import html
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BASE_DIR))
+
+from pypubmed.util.text import normalize, SPECIAL_CHARS
+
+
+GOLDEN = os.path.join(BASE_DIR, 'fixtures', 'abstracts_golden.jsonl')
+
+
+def legacy_normalize(abstract):
+    """
+        the normalization of parse_abstract before pypubmed.util.text, without the prints
+    """
+    abstract = html.remove_tags(abstract)
+
+    n = 0
+    while re.search(r'&.{1,7};', abstract):
+        abstract = html.replace_entities(abstract)
+        n += 1
+        if n > 4:
+            break
+
+    for special, replace in SPECIAL_CHARS.items():
+        abstract = abstract.replace(special, replace)
+
+    return abstract
+
+
+def timeit(func, texts, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            func(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(texts)
+
+
+@click.command()
+@click.option('--repeat', help='repeat times, the best is reported', type=int, default=10, show_default=True)
+@click.option('--copies', help='copies of the corpus in each round', type=int, default=200, show_default=True)
+def main(**kwargs):
+    with open(GOLDEN) as f:
+        corpus = [json.loads(line) for line in f if line.strip()]
+
+    for n, case in enumerate(corpus, 1):
+        assert normalize(case['input']) == case['expected'], 'case {} is different: {!r}'.format(n, case['input'][:80])
+    click.echo('golden corpus: {} cases identical'.format(len(corpus)))
+
+    texts = [case['input'] for case in corpus] * kwargs['copies']
+    plain = [text for text in texts if '<' not in text and '&' not in text]
+
+    for name, items in (('corpus', texts), ('plain', plain)):
+        legacy = timeit(legacy_normalize, items, kwargs['repeat'])
+        current = timeit(normalize, items, kwargs['repeat'])
+        click.echo('{:<8} legacy: {:>8.2f} us/text    current: {:>8.2f} us/text    speedup: {:.1f}x'.format(
+            name, legacy * 1e6, current * 1e6, legacy / current))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,8 +4,8 @@ import json
 
 import click
 
-from pypubmed.core.eutils import Eutils
-from pypubmed.core.citations import ncbi_citations, manual_citations
+from pypubmed.core.citations import CitationFormatter, NCBICitations, CitationCache
+from pypubmed.core.ratelimit import get_limiter
 
 
 __epilog__ = '''
@@ -13,12 +13,16 @@ examples:\n
     citations 1 2 3\n
     citations 1 2 3 -f nlm\n
     citations 1 2 3 -m -f apa\n
+    citations pmid_list.txt -j 8 -o citations.txt\n
 '''
 
 @click.command(name='citations', epilog=__epilog__, help=click.style('generate citations for given pmids', bold=True, fg='magenta'), no_args_is_help=True)
 @click.option('-m', '--manual', help='cite with manual citations, default with ncbi citations', default=False, is_flag=True)
 @click.option('-f', '--fmt', help='the format of citation', type=click.Choice('ama mla apa nlm'.split()), default='ama')
 @click.option('-o', '--outfile', help='the output filename [stdout]')
+@click.option('-j', '--workers', help='the number of concurrent requests of ncbi citations, under the shared keyless rate limit', type=int, default=4, show_default=True)
+@click.option('--cache', help='the cache of ncbi citations, all formats are cached [~/.pypubmed/citations.sqlite3]')
+@click.option('--no-cache', help='do not use the cache of ncbi citations', is_flag=True)
 @click.argument('pmids', nargs=-1)
 @click.pass_obj
 def citations_cli(obj, **kwargs):
@@ -35,15 +39,17 @@ def citations_cli(obj, **kwargs):
     out = open(kwargs['outfile'], 'w') if kwargs['outfile'] else sys.stdout
     with out:
         if kwargs['manual']:
-            e = Eutils(api_key=obj['api_key'])
-            articles = e.efetch(pmid_list)
+            e = obj['eutils']
+            formatter = CitationFormatter.get(kwargs['fmt'])
 
-            click.echo('\n', err=True)
-
-            for article in articles:
-                citation = manual_citations(article, fmt=kwargs['fmt'])
-                out.write('{}\t{}\n'.format(article.pmid, citation))
+            # only the fields of the style are parsed
+            for articles in e.efetch_batches(pmid_list, batch_size=200, fields=formatter.fields):
+                for pmid, citation in formatter.format_batch(articles):
+                    out.write('{}\t{}\n'.format(pmid, citation))
         else:
-            for pmid in pmid_list:
-                citation = ncbi_citations(pmid, fmt=kwargs['fmt'])['orig']
-                out.write('{}\t{}\n'.format(pmid, citation))
+            cache = None if kwargs['no_cache'] else CitationCache(kwargs['cache'])
+            # the citation endpoint does not take the api_key, so the keyless rate applies
+            ncbi = NCBICitations(cache=cache, limiter=get_limiter(None), workers=kwargs['workers'])
+            for pmid, citation in ncbi.citations(pmid_list, fmt=kwargs['fmt']):
+                out.write('{}\t{}\n'.format(pmid, citation or '.'))
+            ncbi.logger.debug('citations: {cached} cached, {fetched} fetched, {failed} failed'.format(**ncbi.stats))
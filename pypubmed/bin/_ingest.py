@@ -0,0 +1,38 @@
+import click
+
+from pypubmed.core.store import ArticleStore
+
+
+__epilog__ = click.style('''
+examples:
+
+\b
+    pypubmed ingest baseline/ updatefiles/
+    pypubmed ingest baseline/ -s pubmed.sqlite3 -j 8
+    pypubmed search pmid_list.txt --store pubmed.sqlite3
+''', fg='yellow')
+
+@click.command(name='ingest', epilog=__epilog__, help=click.style('ingest pubmed baseline/update files into a local store', bold=True, fg='blue'), no_args_is_help=True)
+@click.option('-s', '--store', help='the local article store [~/.pypubmed/articles.sqlite3]')
+@click.option('-j', '--jobs', help='the number of worker processes [cpu count]', type=int)
+@click.option('--force', help='ingest the files which were already ingested', is_flag=True)
+@click.argument('paths', nargs=-1)
+def ingest_cli(**kwargs):
+    # the parsers are imported when the command runs
+    from pypubmed.core.ingest import list_files, ingest
+
+    files = list_files(kwargs['paths'])
+    if not files:
+        click.secho('no xml files found', fg='red')
+        exit(1)
+
+    store = ArticleStore(kwargs['store'])
+    stats = ingest(files, store, jobs=kwargs['jobs'], force=kwargs['force'])
+
+    total_records = 0
+    for pid, stat in sorted(stats.items()):
+        total_records += stat['records']
+        click.secho('worker {}: {files} files, {records} records, {rate:.1f} records/s'.format(
+            pid, rate=stat['records'] / (stat['seconds'] or 1e-9), **stat), fg='green')
+
+    click.secho(f'{total_records} records ingested, {len(store)} records in store: {store.dbfile}', fg='bright_green')
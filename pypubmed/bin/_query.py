@@ -0,0 +1,159 @@
+import os
+import datetime
+
+import click
+
+from pypubmed.core.export import Export
+from pypubmed.core.queries import QueryRegistry
+from pypubmed.core.store import ArticleStore
+from pypubmed.core.filters import ArticleFilter
+
+
+__epilog__ = click.style('''
+examples:
+
+\b
+    pypubmed query add ngs 'NGS[Title] AND Disease[Title/Abstract]' -o ngs.jl -min 5
+    pypubmed query list
+    pypubmed query remove ngs
+\b
+    # the first update fetches all, then only the new and revised articles since the last run
+    pypubmed update ngs
+    pypubmed update ngs --reldate 7
+    pypubmed update ngs --full
+''', fg='yellow')
+
+
+@click.group(name='query', epilog=__epilog__, help=click.style('manage the saved queries', bold=True, fg='cyan'))
+def query_cli():
+    pass
+
+
+@query_cli.command(name='add', help='save a query, an existing one is replaced')
+@click.option('-o', '--outfile', help='the output filename, the type is guessed from the suffix: xlsx, json, jl, parquet, feather', required=True)
+@click.option('-cit', '--cited', help='get cited information', is_flag=True)
+@click.option('-n', '--no-translate', help='do not translate the abstract', is_flag=True)
+@click.option('-b', '--batch-size', help='the batch size for efetch', default=10, type=int, show_default=True)
+@click.option('-f', '--fields', help='the fields to export, eg. pmid,title,year, the others are not parsed')
+@click.option('-min', '--min-factor', help='filter with IF', type=float)
+@click.option('--min-year', help='filter with the minimum year', type=int)
+@click.option('--max-year', help='filter with the maximum year', type=int)
+@click.option('--pub-type', help='filter with the publication type, can be used multiple times, eg. Review', multiple=True)
+@click.option('--journal', help='filter with the journal, can be used multiple times', multiple=True)
+@click.option('-a', '--author', help='export information of authors', is_flag=True, hidden=True)
+@click.argument('name')
+@click.argument('term')
+@click.pass_obj
+def add(obj, name, term, outfile, **options):
+    options.update(pub_type=list(options['pub_type']), journal=list(options['journal']))
+    QueryRegistry().save(name, term, outfile=os.path.abspath(outfile), db=obj['db'], options=options)
+    click.secho(f'query saved: {name}', fg='green')
+
+
+@query_cli.command(name='list', help='list the saved queries')
+def list_queries():
+    for query in QueryRegistry().list():
+        click.secho('{name}\t{db}\t{term}\t{outfile}\tlast run: {last_date} [{last_count} records]'.format(**query))
+
+
+@query_cli.command(name='remove', help='remove a saved query')
+@click.argument('name')
+def remove(name):
+    if QueryRegistry().remove(name):
+        click.secho(f'query removed: {name}', fg='green')
+    else:
+        click.secho(f'no query named: {name}', fg='red')
+        exit(1)
+
+
+def iter_records(articles, author=False):
+    for article in articles:
+        if not author:
+            article.drop_author_details()
+        yield article.to_dict()
+
+
+def delta_filename(outfile, date):
+    """
+        ngs.jl => ngs.delta-20240131.jl
+    """
+    dirname, basename = os.path.split(outfile)
+    stem, _, suffix = basename.partition('.')
+    return os.path.join(dirname, '{}.delta-{}.{}'.format(stem, date.replace('/', ''), suffix))
+
+
+@click.command(name='update', epilog=__epilog__, help=click.style('update a saved query with the articles since the last run', bold=True, fg='cyan'), no_args_is_help=True)
+@click.option('--reldate', help='fetch the articles entered or revised in the last n days, instead of since the last run', type=int)
+@click.option('--full', help='fetch all the articles again', is_flag=True)
+@click.option('--delta', help='the delta file of the new and revised articles [{stem}.delta-{date}.{suffix}, eg. ngs.delta-20240131.jl]')
+@click.option('--store', help='the local article store, the revised articles are refreshed in it [~/.pypubmed/articles.sqlite3]')
+@click.option('--no-store', help='do not use the local article store', is_flag=True)
+@click.argument('name')
+@click.pass_obj
+def update_cli(obj, name, **kwargs):
+    registry = QueryRegistry()
+    query = registry.get(name)
+    if not query:
+        click.secho(f'no query named: {name}, please add it with `pypubmed query add`', fg='red')
+        exit(1)
+
+    options = query['options']
+    outfile = query['outfile']
+    today = datetime.date.today().strftime('%Y/%m/%d')
+
+    # Eutils is created on the first access, with the db of the query and its xml parser
+    obj['db'] = query['db']
+    eutils = obj['eutils']
+    if not kwargs['no_store']:
+        eutils.store = ArticleStore(kwargs['store'])
+
+    article_filter = ArticleFilter(min_factor=options['min_factor'],
+                                   min_year=options['min_year'],
+                                   max_year=options['max_year'],
+                                   pub_types=options['pub_type'],
+                                   journals=options['journal'])
+
+    search_kwargs = dict(cited=options['cited'], translate=not options['no_translate'], fields=options['fields'],
+                         batch_size=options['batch_size'], article_filter=article_filter or None)
+
+    if kwargs['full'] or not query['last_date'] or not os.path.isfile(outfile):
+        eutils.logger.info(f'fetch all the articles of query: {name}')
+        articles = eutils.search(query['term'], **search_kwargs)
+        export = Export(iter_records(articles, options['author']), outfile=outfile, fields=options['fields'])
+        export.export()
+        registry.mark_run(name, today, export.count)
+        return
+
+    new, revised = eutils.esearch_since(query['term'], mindate=query['last_date'], reldate=kwargs['reldate'])
+    if not (new or revised):
+        registry.mark_run(name, today, 0)
+        eutils.logger.info(f'no update for query: {name}')
+        return
+
+    # the revised articles are fetched again instead of read from the store
+    if eutils.use_store and revised:
+        eutils.store.delete_many(revised)
+
+    articles = eutils.search(','.join(new + revised), **search_kwargs)
+    delta = list(iter_records(articles, options['author']))
+
+    delta_file = kwargs['delta'] or delta_filename(outfile, today)
+    Export(delta, outfile=delta_file, fields=options['fields']).export()
+
+    # replace the revised records in place, then append the new ones
+    changed = {str(record['pmid']): record for record in delta}
+
+    def merge():
+        for record in Export.read_records(outfile):
+            yield changed.pop(str(record['pmid']), record)
+        for record in changed.values():
+            yield record
+
+    dirname, basename = os.path.split(outfile)
+    merged_file = os.path.join(dirname, '.update.' + basename)
+    export = Export(merge(), outfile=merged_file, fields=options['fields'])
+    export.export()
+    os.replace(merged_file, outfile)
+
+    registry.mark_run(name, today, len(delta))
+    eutils.logger.info(f'{len(delta)} articles updated, {export.count} articles in {outfile}')
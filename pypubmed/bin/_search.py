@@ -2,12 +2,12 @@ import os
 import re
 import click
 import datetime
-import pickle
 
-from dateutil.parser import parse as date_parse
-
-from pypubmed.util import safe_open
 from pypubmed.core.export import Export
+from pypubmed.core.store import ArticleStore
+from pypubmed.core.translate import TranslateCache
+from pypubmed.core.filters import ArticleFilter
+from pypubmed.core.journal import JobJournal
 
 search_examples = click.style('''
 examples:
@@ -18,6 +18,10 @@ examples:
     pypubmed search 'NGS[Title] AND Disease[Title/Abstract]' -o ngs_disease.xlsx
     pypubmed search 1,2,3,4
     pypubmed search pmid_list.txt
+    pypubmed search pmid_list.txt -b 200 --concurrency 3
+\b
+    # continue an interrupted search, the output is appended
+    pypubmed search ngs -o ngs.jl --resume
 \b
     ########## search pmc ##########
     # parse pmc xml, maybe network error
@@ -32,72 +36,146 @@ examples:
 @click.command(help=click.style('search with pmid or a term', bold=True, fg='green'), epilog=search_examples, no_args_is_help=True)
 @click.option('-cit', '--cited', help='get cited information', default=False, is_flag=True)
 @click.option('-n', '--no-translate', help='do not translate the abstract', default=False, is_flag=True)
+@click.option('--translate-workers', help='the number of concurrent translate requests', default=4, type=int, show_default=True)
 @click.option('-b', '--batch-size', help='the batch size for efetch', default=10, type=int, show_default=True)
+@click.option('--concurrency', help='the number of efetch batches in flight', default=1, type=int, show_default=True)
+@click.option('--unordered', help='output articles as soon as their batch is fetched, instead of in pmid order', is_flag=True)
 @click.option('-min', '--min-factor', help='filter with IF', type=float)
+@click.option('--min-year', help='filter with the minimum year', type=int)
+@click.option('--max-year', help='filter with the maximum year', type=int)
+@click.option('--pub-type', help='filter with the publication type, can be used multiple times, eg. Review', multiple=True)
+@click.option('--journal', help='filter with the journal, can be used multiple times', multiple=True)
 @click.option('-l', '--limit', help='limit the count of output', type=int)
-@click.option('-f', '--fields', help='the fields to export')
-@click.option('-o', '--outfile', help='the output filename', default='pubmed.xlsx', show_default=True)
+@click.option('-f', '--fields', help='the fields to export, eg. pmid,title,year, the others are not parsed')
+@click.option('-o', '--outfile', help='the output filename, the type is guessed from the suffix: xlsx, json, jl, parquet, feather', default='pubmed.xlsx', show_default=True)
 @click.option('-a', '--author', help='export information of authors', is_flag=True, hidden=True)
 
-@click.option('-c', '--cache', help='store translated result to a cache file', is_flag=True)
+@click.option('-c', '--cache', help='store translated result to a cache file [~/.pypubmed/translate.sqlite3]', is_flag=True)
+@click.option('--cache-size', help='the max number of translations kept in the cache file', type=int, default=1000000, show_default=True)
 @click.option('-s', '--retstart', help='the number of start', type=int, default=0, show_default=True)
 @click.option('--convert-pmc', help='convert pmcid to pmid, then parse pubmed xml', is_flag=True)
+@click.option('--store', help='the local article store, articles in it are not fetched again [~/.pypubmed/articles.sqlite3]')
+@click.option('--store-ttl', help='the days before a fetched article in the store expires', type=float, default=30, show_default=True)
+@click.option('--store-size', help='the max number of fetched articles kept in the store', type=int, default=1000000, show_default=True)
+@click.option('--refresh', help='fetch all articles from NCBI, and update the store', is_flag=True)
+@click.option('--no-store', help='do not use the local article store', is_flag=True)
+@click.option('--resume', help='continue an interrupted search from its journal [{outfile}.journal], and append to the output', is_flag=True)
 @click.argument('term', nargs=1)
 @click.pass_obj
 def search(obj, **kwargs):
     
-    data = []
-    translate_cache = {}
-    cache_file = '.translate.cache.pkl'
-    if os.path.isfile(cache_file):
-        with safe_open(cache_file, 'rb') as f:
-            translate_cache = pickle.load(f)
+    translate_cache = TranslateCache(max_entries=kwargs['cache_size'])
+
+    # import the legacy pickle cache
+    legacy_cache_file = '.translate.cache.pkl'
+    if os.path.isfile(legacy_cache_file) and not len(translate_cache):
+        n = translate_cache.load_pickle(legacy_cache_file)
+        obj['eutils'].logger.debug(f'imported {n} translations from {legacy_cache_file}')
 
     eutils = obj['eutils']
     if kwargs['convert_pmc']:
         eutils.convert_pmc = True
+    if not kwargs['no_store']:
+        eutils.store = ArticleStore(kwargs['store'],
+                                    ttl=kwargs['store_ttl'] * 24 * 3600,
+                                    max_records=kwargs['store_size'],
+                                    refresh=kwargs['refresh'])
+
+    # the filters run before the enrichments, the year range, pub types and journals are pushed into the term
+    article_filter = ArticleFilter(min_factor=kwargs['min_factor'],
+                                   min_year=kwargs['min_year'],
+                                   max_year=kwargs['max_year'],
+                                   pub_types=kwargs['pub_type'],
+                                   journals=kwargs['journal'])
+
+    # the journal of the job, created when the first batches are on disk, removed when the job completes
+    job_journal = JobJournal(kwargs['outfile'] + '.journal')
+    meta = {key: kwargs[key] for key in ('term', 'batch_size', 'fields', 'min_factor', 'min_year', 'max_year')}
+    meta.update(db=eutils.db, pub_type=list(kwargs['pub_type']), journal=list(kwargs['journal']))
+
+    seen = set()
+    resume = kwargs['resume'] and job_journal.resumable
+    if resume:
+        changed = [key for key in meta if key != 'batch_size' and job_journal.get(key) != meta[key]]
+        if changed:
+            eutils.logger.error('the job is different from the journal: {}, please check!'.format(', '.join(changed)))
+            exit(1)
+        kwargs['batch_size'] = job_journal.get('batch_size')
+
+        # the articles of the last unfinished batch may be exported already
+        if os.path.isfile(kwargs['outfile']):
+            seen = {str(record['pmid']) for record in Export.read_records(kwargs['outfile'], columns=['pmid'])}
+    else:
+        if kwargs['resume']:
+            eutils.logger.warning('nothing to resume, start a new job')
+        job_journal.start(**meta)
+
+    articles = eutils.search(translate=not kwargs['no_translate'], translate_cache=translate_cache,
+                             article_filter=article_filter or None, job_journal=job_journal, exclude=seen, **kwargs)
+
+    failed = []
+
+    def iter_data():
+        """
+            stream the articles into Export, nothing is kept in memory
+        """
+        try:
+            n = len(seen)
+            for article in articles:
+                if seen and str(article.pmid) in seen:
+                    continue
+                n += 1
+
+                eutils.logger.debug(f'{n}. {article}')
+
+                # store translated result to cache file
+                abstract_cn = getattr(article, 'abstract_cn', None)
+                if kwargs['cache'] and abstract_cn and abstract_cn != 'translate failed':
+                    translate_cache[article.pmid] = abstract_cn
+
+                # export author information or not
+                if not kwargs['author']:
+                    article.drop_author_details()
+
+                yield article.to_dict()
+
+                if kwargs['limit'] and n >= kwargs['limit']:
+                    break
+        except KeyboardInterrupt:
+            failed.append(None)
+        except Exception as e:
+            # export what was fetched, then raise
+            failed.append(e)
+
+    # the batches done are committed when jl is flushed, the other outputs are only complete when saved
+    export = Export(iter_data(), append=resume, **kwargs)
+    if export.line_oriented:
+        export.on_flush = job_journal.commit
+    export.export()
+
+    if failed:
+        job_journal.commit()
+        if job_journal.created:
+            eutils.logger.warning(f'the search is not complete, continue it with --resume, journal: {job_journal.dbfile}')
+        else:
+            eutils.logger.warning('the search is not complete, no batch was done')
+        if failed[0] is not None:
+            raise failed[0]
+    else:
+        job_journal.remove()
 
-    articles = eutils.search(translate=not kwargs['no_translate'], translate_cache=translate_cache, **kwargs)
-
-    try:
-        for n, article in enumerate(articles, 1):
-            eutils.logger.debug(f'{n}. {article}')
-
-            # store translated result to cache file
-            if kwargs['cache']:
-                translate_cache[article.pmid] = article.abstract_cn
-
-            # filter impact factor
-            if kwargs['min_factor'] and (article.impact_factor != '.' and article.impact_factor < kwargs['min_factor']):
-                continue
-
-            # export author information or not
-            if not kwargs['author']:
-                del article.author_mail
-                del article.author_first
-                del article.author_last
-
-            data.append(article.to_dict())
-
-            if kwargs['limit'] and n >= kwargs['limit']:
-                break
-    except KeyboardInterrupt:
-        pass
-
-    if kwargs['min_factor']:
-        eutils.logger.info('A total of {} articles were found, {} remaining after filtering IF>={}'.format(n, len(data), kwargs['min_factor']))
+    if article_filter:
+        eutils.logger.info(article_filter.report())
 
     if kwargs['cache']:
-        with safe_open(cache_file, 'wb') as out:
-            pickle.dump(translate_cache, out)
-        eutils.logger.debug(f'save cache file: {cache_file}')
-
-    Export(data, **kwargs).export()
+        eutils.logger.debug(f'translate cache: {translate_cache.dbfile}')
 
 
 @click.command(help=click.style('generate advance search string', bold=True, fg='cyan'))
 @click.pass_obj
 def advance_search(obj, **kwargs):
+    from dateutil.parser import parse as date_parse
+
     fields = obj['eutils'].validate_fields()
 
     query_box = ''
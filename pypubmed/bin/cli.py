@@ -6,8 +6,9 @@ import click
 
 from ._search import search, advance_search
 from ._citations import citations_cli
+from ._ingest import ingest_cli
+from ._query import query_cli, update_cli
 from pypubmed import version_info
-from pypubmed.core.eutils import Eutils
 
 
 log_level_maps = {
@@ -21,6 +22,24 @@ __epilog__ = click.style('contact: {author} <{author_email}>'.format(**version_i
 
 CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 
+
+class LazyObj(dict):
+    """
+        the context object of subcommands, `Eutils` is created on the first access of obj['eutils'],
+        so the subcommands not using it, and --help, start without importing or validating anything
+    """
+    def __missing__(self, key):
+        if key != 'eutils':
+            raise KeyError(key)
+
+        from pypubmed.core.eutils import Eutils
+
+        e = Eutils(api_key=self['api_key'], proxies=self['proxies'], db=self['db'])
+        e.logger.level = int(self['log_level'])
+        self['eutils'] = e
+        return e
+
+
 @click.group(context_settings=CONTEXT_SETTINGS, epilog=__epilog__, help=click.style(version_info['desc'], fg='bright_blue', bold=True))
 @click.option('-l', '--log-level', help='the mode of loggging',
               show_default=True, default='debug',
@@ -34,17 +53,16 @@ CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
 def cli(ctx, **kwargs):
 
     kwargs['log_level'] = log_level_maps[kwargs['log_level']]
-    e = Eutils(api_key=kwargs['api_key'], proxies=kwargs['proxies'], db=kwargs['db'])
-    e.logger.level = int(kwargs['log_level'])
-    ctx.obj = {
-        'eutils': e
-    }
+    ctx.obj = LazyObj(kwargs)
 
 
 def main():
     cli.add_command(search)
     cli.add_command(advance_search)
     cli.add_command(citations_cli)
+    cli.add_command(ingest_cli)
+    cli.add_command(query_cli)
+    cli.add_command(update_cli)
     cli()
 
 
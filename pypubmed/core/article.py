@@ -1,28 +1,134 @@
 import json
 
 
+def to_int(value):
+    if value in (None, '', '.'):
+        return None
+    return int(value)
+
+
+def to_float(value):
+    if value in (None, '', '.'):
+        return None
+    return float(value)
+
+
+def to_text(value):
+    return None if value == '.' else value
+
+
 class Article(object):
+    """
+        a compact record of an article
+
+        - the known fields are fixed slots, the others are kept in an overflow mapping
+        - pmid/year are int, impact_factor is float, missing values are None instead of '.'
+        - the fields not given are not set, as before: `getattr(article, 'abstract_cn', None)`
+
+        >>> article = Article(pmid='1', year='2020', impact_factor='.', title='test', note='extra')
+        >>> article.pmid, article.year, article.impact_factor
+        (1, 2020, None)
+        >>> article.to_dict()
+        {'pmid': 1, 'year': 2020, 'title': 'test', 'impact_factor': None, 'note': 'extra'}
+    """
+    # the order of the slots is the order of `to_dict`, same as the parsers and the annotations
+    __slots__ = (
+        'pmid', 'e_issn', 'issn', 'journal', 'iso_abbr', 'med_abbr', 'pubdate', 'year', 'pubmed_pubdate',
+        'pagination', 'volume', 'issue', 'title', 'keywords', 'pub_status', 'abstract',
+        'author_mail', 'author_first', 'author_last', 'authors', 'author_records', 'affiliations', 'pub_types', 'doi', 'pmc',
+        'impact_factor', 'cited', 'abstract_cn',
+        '_extras',
+    )
+
+    # the author fields besides `authors` and `affiliations`
+    author_details = ('author_mail', 'author_first', 'author_last', 'author_records')
+
+    converters = {
+        'pmid': to_int,
+        'year': to_int,
+        'impact_factor': to_float,
+        'keywords': None,
+        'pub_types': None,
+        'author_records': None,
+        'cited': None,
+    }
+
     def __init__(self, **kwargs):
+        object.__setattr__(self, '_extras', None)
         for k, v in kwargs.items():
             setattr(self, k, v)
 
+    def __setattr__(self, name, value):
+        converter = self.converters.get(name, to_text)
+        if converter:
+            value = converter(value)
+        try:
+            object.__setattr__(self, name, value)
+        except AttributeError:
+            if self._extras is None:
+                object.__setattr__(self, '_extras', {})
+            self._extras[name] = value
+
+    def __getattr__(self, name):
+        # only called when the normal lookup failed: an unset slot or an extra field
+        if name != '_extras' and self._extras and name in self._extras:
+            return self._extras[name]
+        raise AttributeError(name)
+
+    def __delattr__(self, name):
+        if self._extras and name in self._extras:
+            del self._extras[name]
+        else:
+            object.__delattr__(self, name)
+
+    def __getstate__(self):
+        return self.to_dict()
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
     def to_dict(self):
-        return self.__dict__
+        context = {}
+        for field in self.__slots__[:-1]:
+            try:
+                context[field] = object.__getattribute__(self, field)
+            except AttributeError:
+                pass
+        if self._extras:
+            context.update(self._extras)
+        return context
 
     def to_json(self, **kwargs):
-        return json.dumps(self.__dict__, ensure_ascii=False, **kwargs)
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
 
     @property
     def fields(self):
-        return list(self.__dict__.keys())
+        return list(self.to_dict().keys())
+
+    def drop_author_details(self):
+        """
+            delete the author details, they are exported only with `--author`
+        """
+        for name in self.author_details:
+            if hasattr(self, name):
+                delattr(self, name)
 
     def __repr__(self):
-        return 'Article[{pmid} - {title}]'.format(**self.__dict__)
+        return 'Article[{} - {}]'.format(getattr(self, 'pmid', None), getattr(self, 'title', None))
+
+
+class ArticleBatch(list):
+    """
+        the articles of one efetch batch, `offset` is the position of the batch in the resolved ids
+    """
+    def __init__(self, articles=(), offset=None):
+        super(ArticleBatch, self).__init__(articles)
+        self.offset = offset
 
 
 if __name__ == '__main__':
-    
+
     p = Article(pmid=1, issn='1234-5678', title='test')
     print(p)
     print(p.to_dict())
-    print(p.to_json())
\ No newline at end of file
+    print(p.to_json())
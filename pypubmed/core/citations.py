@@ -16,61 +16,327 @@ Format:
     - NLM: National Library of Medicine
 """
 import os
-import re
 import json
+import time
+import threading
+from string import Formatter
+from collections import namedtuple
 
 import click
-from webrequests import WebRequest
+from simple_loggers import SimpleLogger
 
+from pypubmed.util import bounded_map
+from pypubmed.util.cache import SqliteCache
+from pypubmed.core.ratelimit import THROTTLE_CODES
 
 
-def ncbi_citations(pmid, fmt=None):
+def ncbi_citations(pmid, fmt=None, limiter=None, max_try=5):
+    """
+        fetch the citations of all formats for a pmid, return the one of `fmt` if given
+
+        limiter: a shared `RateLimiter`, 429/5xx responses slow it down and are retried
+
+        return None if all tries failed
+    """
+    from webrequests import WebRequest
+
     url = 'https://pubmed.ncbi.nlm.nih.gov/{}/citations/'.format(pmid)
-    data = WebRequest.get_response(url).json()
-    if fmt in data:
-        return data[fmt]
-    return data
+    for _ in range(max_try):
+        if limiter is not None:
+            limiter.acquire()
+        resp = WebRequest.get_response(url, max_try=1, allowed_codes=[200] + list(THROTTLE_CODES))
+        if resp is None:
+            continue
+        if limiter is not None:
+            limiter.feedback(resp.status_code)
+        if resp.status_code == 200:
+            data = resp.json()
+            if fmt in data:
+                return data[fmt]
+            return data
+    return None
 
 
-def manual_citations(article, fmt='ama'):
+class CitationCache(SqliteCache):
+    """
+        the NCBI citations keyed by pmid, all the formats of a pmid are stored together
+
+        >>> cache = CitationCache()
+        >>> cache.set(1, {'ama': {'orig': '...', 'format': '...'}, 'apa': ...})
+        >>> cache.get_many([1, 2])
+        {'1': {'ama': {...}, 'apa': ...}}
+    """
+    default_name = 'citations.sqlite3'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS citations (
+            pmid TEXT PRIMARY KEY,
+            data TEXT,
+            updated REAL
+        );
+    '''
+
+    def get_many(self, pmids):
+        sql = 'SELECT pmid, data FROM citations WHERE pmid IN ({})'
+        return {pmid: json.loads(data) for pmid, data in self.select_many(sql, map(str, pmids))}
+
+    def set(self, pmid, data):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO citations VALUES (?, ?, ?)',
+                              (str(pmid), json.dumps(data, ensure_ascii=False), time.time()))
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM citations').fetchone()[0]
+
+
+class NCBICitations(object):
+    """
+        fetch the NCBI citations of many pmids concurrently, under the shared rate limiter
+
+        - the fetched citations are cached with all formats, switching the format needs no request
+        - the citations are yielded in the order of input
+
+        >>> ncbi = NCBICitations(cache=CitationCache(), limiter=get_limiter(), workers=4)
+        >>> for pmid, citation in ncbi.citations(['1', '2', '3'], fmt='apa'):
+        ...     print(pmid, citation)
+    """
+    logger = SimpleLogger('NCBICitations')
 
-    doi = ' doi:{}'.format(article.doi) if article.doi else ''
-    issue = '({})'.format(article.issue) if article.issue else ''
+    def __init__(self, cache=None, limiter=None, workers=4):
+        self.cache = cache
+        self.limiter = limiter
+        self.workers = workers
+        self.stats = {'cached': 0, 'fetched': 0, 'failed': 0}
+        self.lock = threading.Lock()
 
-    # ========================================
-    # # merge the pagination?
-    # # - S1-22; quiz S23-4  =>  S1-S24
-    # # - 548-554            =>  548-54
-    # ========================================
-    # pagination_merge = article.pagination
+    def count(self, key):
+        with self.lock:
+            self.stats[key] += 1
 
-    if fmt == 'ama':
-        citation = '{authors}. {title} {med_abbr}. {year};{volume}{issue}:{pagination}.{doi}'
-        if len(article.authors) > 5:
-            authors = ', '.join('{} {}'.format(author[0], author[2]) for author in article.authors[:3]) + ' et al'
+    def fetch(self, pmid):
+        data = ncbi_citations(pmid, limiter=self.limiter)
+        if data is None:
+            self.count('failed')
+            self.logger.warning(f'failed to fetch the citations of: {pmid}')
+            return None
+
+        self.count('fetched')
+        if self.cache is not None:
+            self.cache.set(pmid, data)
+        return data
+
+    def citations(self, pmids, fmt='ama'):
+        """
+            yield (pmid, citation), citation is None if failed
+        """
+        pmids = [str(pmid) for pmid in pmids]
+        cached = self.cache.get_many(pmids) if self.cache is not None else {}
+        self.stats['cached'] += len(cached)
+
+        def get(pmid):
+            data = cached.get(pmid)
+            if data is None:
+                data = self.fetch(pmid)
+            return pmid, data
+
+        if self.workers > 1:
+            results = bounded_map(get, pmids, workers=self.workers)
         else:
-            authors = ', '.join('{} {}'.format(author[0], author[2]) for author in article.authors)
-    elif fmt == 'mla':
-        first_author = '{}, {}'.format(*article.authors[0][:2])
-        issue = ',{}'.format(article.issue) if article.issue else ''
-        citation = '{first_author} et al. \u201c{title}\u201d {journal} vol. {volume}{issue} ({year}): {pagination}.{doi}'
-    elif fmt == 'apa':
-        doi = ' https://doi.org/{}'.format(article.doi) if article.doi else ''
-        author_all = ', '.join('{}, {}.'.format(each[0], '. '.join(each[2])) for each in article.authors[:-1])
-        last_author = article.authors[-1]
-        if len(last_author) == 1:
-            last_author = last_author[0]
+            results = map(get, pmids)
+
+        for pmid, data in results:
+            yield pmid, data[fmt]['orig'] if data and fmt in data else None
+
+
+class Author(namedtuple('Author', ['last', 'fore', 'initials', 'collective'])):
+    """
+        an author of the citations, from the `author_records` of the parsers
+
+        >>> Author.from_record(['Smith', 'John A', 'JA'])
+        Author(last='Smith', fore='John A', initials='JA', collective=False)
+        >>> Author.from_record(['NGS Consortium'])
+        Author(last='NGS Consortium', fore='', initials='', collective=True)
+    """
+    __slots__ = ()
+
+    @classmethod
+    def from_record(cls, record):
+        """
+            record: [LastName, ForeName, Initials] or [CollectiveName]
+        """
+        if len(record) == 1:
+            return cls(record[0], '', '', True)
+        last, fore, initials = record
+        return cls(last, fore, initials, False)
+
+    @property
+    def short(self):
+        """
+            Smith JA, or the group name
+        """
+        return ' '.join(name for name in (self.last, self.initials) if name)
+
+
+def parse_authors(authors):
+    """
+        parse the newline-joined authors string into `Author` records,
+        only for the articles stored without `author_records`, group names are not told apart
+
+        >>> parse_authors('John A Smith\nConsortium')
+        [Author(last='Smith', fore='John A', initials='JA', collective=False),
+         Author(last='Consortium', fore='', initials='', collective=True)]
+    """
+    records = []
+    for name in (authors or '').split('\n'):
+        name = name.strip()
+        if not name:
+            continue
+        fore, _, last = name.rpartition(' ')
+        if not fore:
+            records.append(Author(name, '', '', True))
         else:
-            last_author = '{}, {}.'.format(last_author[0], '. '.join(last_author[2]))
-        citation = '{author_all}, & {last_author} ({year}). {title} {journal}, {volume}{issue}, {pagination}.{doi}'
-    elif fmt == 'nlm':
-        author_list = ', '.join('{} {}'.format(each[0], each[2]) if len(each) >= 3 else ';{}'.format(each[0]) for each in article.authors)
-        doi = doi + '. ' if doi else ' '
-        citation = '{author_list}. {title} {med_abbr}. {pubdate};{volume}{issue}:{pagination}.{doi}PMID:{pmid}'
-        if article.pmc:
-            citation += '; PMCID: {pmc}.'
+            initials = ''.join(part[0] for part in fore.replace('-', ' ').replace('.', ' ').split())
+            records.append(Author(last, fore, initials, False))
+    return records
+
+
+def article_authors(article):
+    """
+        the `Author` records of an article, from its `author_records` if parsed
+    """
+    records = getattr(article, 'author_records', None)
+    if records is not None:
+        return [Author.from_record(record) for record in records]
+    return parse_authors(getattr(article, 'authors', None))
+
+
+def ama_authors(authors):
+    """
+        Smith JA, Doe J, Roe R, et al. (the first 3 when more than 6)
+    """
+    names = [a.short for a in authors]
+    if len(names) > 6:
+        names = names[:3] + ['et al']
+    return ', '.join(names) + '. ' if names else ''
+
+
+def mla_authors(authors):
+    """
+        Smith, John A., Doe, John, and Jane Roe. or Smith, John A., et al.
+    """
+    if not authors:
+        return ''
+    # the initials stand for a missing ForeName
+    first = authors[0]
+    first_name = first.fore or first.initials
+    first = first.last if first.collective or not first_name else '{}, {}'.format(first.last, first_name)
+    if len(authors) == 1:
+        return first + '. '
+    if len(authors) == 2:
+        second = authors[1]
+        second = second.last if second.collective else ' '.join(name for name in (second.fore or second.initials, second.last) if name)
+        return '{}, and {}. '.format(first, second)
+    return first + ', et al. '
+
+
+def apa_authors(authors):
+    """
+        Smith, J. A., Doe, J., & Roe, R. (the first 19, ..., the last when more than 20)
+    """
+    names = [a.last if a.collective or not a.initials else '{}, {}.'.format(a.last, '. '.join(a.initials)) for a in authors]
+    if not names:
+        return ''
+    if len(names) == 1:
+        return names[0] + ' '
+    if len(names) > 20:
+        return ', '.join(names[:19]) + ', ... ' + names[-1] + ' '
+    return ', '.join(names[:-1]) + ', & ' + names[-1] + ' '
+
+
+def nlm_authors(authors):
+    """
+        Smith JA, Doe J; NGS Consortium.
+    """
+    persons = ', '.join(a.short for a in authors if not a.collective)
+    groups = '; '.join(a.last for a in authors if a.collective)
+    names = '; '.join(part for part in (persons, groups) if part)
+    return names + '. ' if names else ''
 
-    citation = citation.format(**dict(article.to_dict(), **locals()))
 
-    return citation
+class CitationFormatter(object):
+    """
+        a citation style compiled once, then applied to many articles
 
+        - template:     the fields of the article, and `authors`
+        - authors:      format the `Author` records of `author_records`, with the separator after them
+        - affixes:      the wrappers of the optional fields with their separators, applied only when the field has a value
+
+        >>> formatter = CitationFormatter.get('apa')
+        >>> formatter.format(article)
+        >>> formatter.format_batch(articles)
+    """
+    styles = {
+        'ama': {
+            'template': '{authors}{title} {med_abbr}. {year};{volume}{issue}{pagination}.{doi}',
+            'authors': ama_authors,
+            'affixes': {'issue': '({})', 'pagination': ':{}', 'doi': ' doi:{}'},
+        },
+        'mla': {
+            'template': '{authors}\u201c{title}\u201d {journal}{volume}{issue} ({year}){pagination}.{doi}',
+            'authors': mla_authors,
+            'affixes': {'volume': ' vol. {}', 'issue': ',{}', 'pagination': ': {}', 'doi': ' doi:{}'},
+        },
+        'apa': {
+            'template': '{authors}({year}). {title} {journal}{volume}{issue}{pagination}.{doi}',
+            'authors': apa_authors,
+            'affixes': {'volume': ', {}', 'issue': '({})', 'pagination': ', {}', 'doi': ' https://doi.org/{}'},
+        },
+        'nlm': {
+            'template': '{authors}{title} {med_abbr}. {pubdate};{volume}{issue}{pagination}.{doi}PMID:{pmid}{pmc}',
+            'authors': nlm_authors,
+            'affixes': {'issue': '({})', 'pagination': ':{}', 'doi': ' doi:{}. ', 'pmc': '; PMCID: {}.'},
+            'defaults': {'doi': ' '},
+        },
+    }
+
+    _compiled = {}
+
+    def __init__(self, fmt='ama'):
+        style = self.styles[fmt]
+        self.fmt = fmt
+        self.format_authors = style['authors']
+        self.render = style['template'].format_map
+
+        # the fields of the template, authors are formatted with the records
+        names = [name for _, name, _, _ in Formatter().parse(style['template']) if name]
+        self.fields = ['pmid', 'author_records'] + [name for name in names if name != 'pmid']
+
+        affixes = style['affixes']
+        defaults = style.get('defaults', {})
+        self.getters = [(name, affixes.get(name, '{}').format, defaults.get(name, '')) for name in names if name != 'authors']
+
+    @classmethod
+    def get(cls, fmt='ama'):
+        """
+            the compiled formatter of a style, compiled once for each process
+        """
+        if fmt not in cls._compiled:
+            cls._compiled[fmt] = cls(fmt)
+        return cls._compiled[fmt]
+
+    def format(self, article):
+        values = {'authors': self.format_authors(article_authors(article))}
+        for name, affix, default in self.getters:
+            value = getattr(article, name, None)
+            values[name] = affix(value) if value not in (None, '', '.') else default
+        return self.render(values)
+
+    def format_batch(self, articles):
+        """
+            return [(pmid, citation), ...] for a batch of articles
+        """
+        format_article = self.format
+        return [(article.pmid, format_article(article)) for article in articles]
+
+
+def manual_citations(article, fmt='ama'):
+    return CitationFormatter.get(fmt).format(article)
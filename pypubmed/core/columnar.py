@@ -0,0 +1,167 @@
+"""
+    Columnar output of articles: Parquet and Arrow IPC (Feather)
+
+    - typed columns: pmid/year are integers, impact_factor is float, keywords/pub_types are lists
+    - missing values are nulls instead of '.'
+    - the records are written in row groups, the memory keeps flat for big results
+
+    `pyarrow` is required: python3 -m pip install pyarrow
+"""
+import json
+import operator
+import itertools
+
+from pypubmed.util import chunked
+
+
+COLUMN_TYPES = {
+    'pmid': 'int64',
+    'year': 'int32',
+    'impact_factor': 'float64',
+    'keywords': 'list',
+    'pub_types': 'list',
+    'cited': 'cited',
+}
+
+FORMATS = ('parquet', 'feather', 'arrow')
+
+
+def import_pyarrow():
+    try:
+        import pyarrow
+        return pyarrow
+    except ImportError:
+        raise ImportError('pyarrow is required for parquet/arrow output, please install it: python3 -m pip install pyarrow')
+
+
+def build_schema(fields):
+    pa = import_pyarrow()
+
+    types = {
+        'int64': pa.int64(),
+        'int32': pa.int32(),
+        'float64': pa.float64(),
+        'list': pa.list_(pa.string()),
+        'cited': pa.struct([('count', pa.int32()), ('links', pa.list_(pa.string()))]),
+    }
+    return pa.schema([(field, types.get(COLUMN_TYPES.get(field), pa.string())) for field in fields])
+
+
+def to_number(value, typ):
+    if value in (None, '', '.'):
+        return None
+    try:
+        return typ(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize(context, fields):
+    """
+        convert a context to the types of the schema
+    """
+    record = {}
+    for field in fields:
+        value = context.get(field)
+        kind = COLUMN_TYPES.get(field)
+        if kind in ('int64', 'int32'):
+            value = to_number(value, int)
+        elif kind == 'float64':
+            value = to_number(value, float)
+        elif kind == 'list':
+            value = list(value) if isinstance(value, (list, tuple)) else None
+        elif kind == 'cited':
+            value = value if isinstance(value, dict) else None
+        elif value in ('', '.'):
+            value = None
+        elif value is not None and not isinstance(value, str):
+            value = json.dumps(value, ensure_ascii=False) if isinstance(value, (list, dict)) else str(value)
+        record[field] = value
+    return record
+
+
+def write(data, outfile, fmt='parquet', fields=None, row_group_size=10000):
+    """
+        write the contexts into a parquet/feather file, one row group for every `row_group_size` records
+
+        return the number of records
+    """
+    pa = import_pyarrow()
+
+    data = iter(data)
+    first = next(data, None)
+    if first is None:
+        return 0
+
+    fields = fields or list(first.keys())
+    schema = build_schema(fields)
+
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(outfile, schema, compression='zstd')
+    else:
+        import pyarrow.ipc as ipc
+        writer = ipc.new_file(outfile, schema, options=ipc.IpcWriteOptions(compression='zstd'))
+
+    count = 0
+    with writer:
+        for chunk in chunked(itertools.chain([first], data), row_group_size):
+            table = pa.Table.from_pylist([normalize(context, fields) for context in chunk], schema=schema)
+            writer.write_table(table)
+            count += len(chunk)
+
+    return count
+
+
+def load(path, columns=None, filters=None):
+    """
+        load a parquet/feather file as a pyarrow.Table
+
+        columns:    read only the selected columns
+        filters:    parquet only, eg. [('year', '>=', 2020), ('impact_factor', '>', 10)]
+
+        >>> table = load('out.parquet', columns=['pmid', 'title', 'year'], filters=[('year', '>=', 2020)])
+        >>> table.to_pandas()
+    """
+    import_pyarrow()
+
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=columns, filters=filters)
+
+    import pyarrow.feather as feather
+    table = feather.read_table(path, columns=columns)
+    if filters:
+        table = table.filter(_expression(filters))
+    return table
+
+
+def _expression(filters):
+    """
+        convert the parquet style filters to a pyarrow expression
+    """
+    import pyarrow.compute as pc
+
+    ops = {'=': operator.eq, '==': operator.eq, '!=': operator.ne, '<': operator.lt,
+           '<=': operator.le, '>': operator.gt, '>=': operator.ge}
+
+    expression = None
+    for column, op, value in filters:
+        if op == 'in':
+            each = pc.field(column).isin(value)
+        else:
+            each = ops[op](pc.field(column), value)
+        expression = each if expression is None else expression & each
+    return expression
+
+
+def iter_records(path, columns=None, filters=None, batch_size=10000):
+    """
+        yield the records as dicts, eg. for re-export:
+
+        >>> Export(iter_records('out.parquet', columns=['pmid', 'title']), outfile='out.xlsx').export()
+    """
+    table = load(path, columns=columns, filters=filters)
+    for batch in table.to_batches(max_chunksize=batch_size):
+        for record in batch.to_pylist():
+            yield record
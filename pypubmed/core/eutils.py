@@ -3,20 +3,26 @@
 """
 import os
 import re
+import datetime
 import textwrap
 
+import json
+import time
+import hashlib
+
 import click
-import prettytable
 
-from impact_factor.core import Factor as ImpactFactor
-from googletranslatepy import Translator as GoogleTrans
 from simple_loggers import SimpleLogger
 from webrequests import WebRequest
-import pmc_id_converter
 
 
-from pypubmed.util import pubmed_xml_parser, pmc_xml_parser
-from pypubmed.core.article import Article
+from pypubmed.util import pubmed_xml_parser, pmc_xml_parser, bounded_map, chunked
+from pypubmed.util.cache import CACHE_DIR
+from pypubmed.core.article import Article, ArticleBatch
+from pypubmed.core.ratelimit import get_limiter, THROTTLE_CODES
+from pypubmed.core.idconv import PMCConverter
+from pypubmed.core.factor import FactorIndex
+from pypubmed.core.translate import TranslatePipeline
 
 
 class Eutils(object):
@@ -24,6 +30,8 @@ class Eutils(object):
         params:
             db          database name
             api_key     api_key or NCBI_API_KEY in environment
+            store       an ArticleStore, articles found in it are not fetched,
+                        and the fetched articles are saved into it
 
         optional params:
             term        term for esearch
@@ -31,18 +39,62 @@ class Eutils(object):
             field       field for esearch
     """
     base_url = 'https://eutils.ncbi.nlm.nih.gov/entrez/eutils/'
+    history_batch_size = 500
+    esearch_cap = 9999
     logger = SimpleLogger('Eutils')
-    IF = ImpactFactor()
+    IF = FactorIndex()
+
+    # the result of api_key validation is reused within the ttl
+    api_key_ttl = 7 * 24 * 3600
+    api_key_cachefile = os.path.join(CACHE_DIR, 'api_key.json')
+
+    # the parsed fields required by an enrichment, besides pmid
+    field_sources = {
+        'impact_factor': ('issn', 'e_issn'),
+        'abstract_cn': ('abstract', ),
+    }
 
-    def __init__(self, db='pubmed', convert_pmc=False, proxies=None, api_key=None, **kwargs):
+    def __init__(self, db='pubmed', convert_pmc=False, proxies=None, api_key=None, store=None, **kwargs):
         self.db = db
         self.api_key = api_key
+        self.limiter = get_limiter(api_key)
         self.validate_api_key()
+        self.limiter = get_limiter(self.api_key)
         self.convert_pmc = convert_pmc
+        self._pmc_converter = None
+        self.store = store
         self.xml_parser = pubmed_xml_parser if db == 'pubmed' else pmc_xml_parser
 
-        self.TR = GoogleTrans(proxies=proxies)
-        self.TR_OK = self.TR.check_proxies()
+        self.proxies = proxies
+        self._TR = None
+        self._TR_OK = None
+
+    @property
+    def TR(self):
+        """
+            the translator, created when the translation is used
+        """
+        if self._TR is None:
+            from googletranslatepy import Translator as GoogleTrans
+            self._TR = GoogleTrans(proxies=self.proxies)
+        return self._TR
+
+    @property
+    def TR_OK(self):
+        """
+            the translator is probed once, on the first translation
+        """
+        if self._TR_OK is None:
+            self._TR_OK = self.TR.check_proxies()
+        return self._TR_OK
+
+    @TR.setter
+    def TR(self, translator):
+        self._TR = translator
+
+    @TR_OK.setter
+    def TR_OK(self, value):
+        self._TR_OK = value
 
     def parse_params(self, **kwargs):
         """
@@ -59,7 +111,30 @@ class Eutils(object):
 
         return params
 
-    def esearch(self, term, retstart=0, retmax=250, head=False, limit=None, **kwargs):
+    def request(self, url, params=None, allowed_codes=(200,), max_try=5, **kwargs):
+        """
+            send a request under the shared rate limiter
+
+            - 429/5xx responses slow down the limiter and are retried
+            - return None if all tries failed
+        """
+        allowed_codes = list(allowed_codes)
+        for n in range(max_try):
+            self.limiter.acquire()
+            resp = WebRequest.get_response(url, params=params, max_try=1,
+                                           allowed_codes=allowed_codes + list(THROTTLE_CODES), **kwargs)
+            if resp is None:
+                continue
+
+            self.limiter.feedback(resp.status_code)
+            if resp.status_code in allowed_codes:
+                return resp
+            self.logger.warning('{}st time bad status code: {}, retrying ...'.format(n + 1, resp.status_code))
+
+        self.logger.error('failed requests for url: {}'.format(url))
+        return None
+
+    def esearch(self, term, retstart=0, retmax=250, head=False, limit=None, usehistory=False, **kwargs):
         """
             https://www.ncbi.nlm.nih.gov/books/NBK25499/#chapter4.ESearch
 
@@ -67,13 +142,21 @@ class Eutils(object):
             >> - esearch.cgi?db=pubmed&term=ngs
             >> - esearch.cgi?db=pubmed&term=ngs&retmode=xml&field=TIAB
             >> - esearch.cgi?db=pubmed&term=ngs[Title/Abstract]&retmode=xml
+
+            usehistory: post the result to the history server and return a history dict,
+                        which can be passed to efetch directly instead of an idlist
+            >> - esearch.cgi?db=pubmed&term=ngs&usehistory=y
         """
         url = self.base_url + 'esearch.fcgi'
+
+        if usehistory:
+            return self.esearch_history(term, retstart=retstart, limit=limit, **kwargs)
+
         params = self.parse_params(term=term, retmode='json', retstart=retstart, retmax=retmax, **kwargs)
 
         # print(params)
 
-        result = WebRequest.get_response(url, params=params).json()['esearchresult']
+        result = self.request(url, params=params).json()['esearchresult']
 
         if head:
             return result
@@ -82,11 +165,6 @@ class Eutils(object):
         # querytranslation = result['querytranslation']
         self.logger.info(f'\x1b[1;31m{count}\x1b[0m articles found')
 
-        if limit is None and int(result['count']) > 250:
-            self.logger.warning('too many results, you can limit output with option "-l/--limit N", '
-                                'or simplify your input with sub-command "advance-search" ')
-            exit(1)
-
         idlist = result['idlist']
 
         while int(result['retstart']) + int(result['retmax']) < int(result['count']):
@@ -94,7 +172,7 @@ class Eutils(object):
                 break
             retstart = int(result['retstart']) + int(result['retmax'])
             params = self.parse_params(term=term, retmode='json', retstart=retstart, retmax=retmax, **kwargs)
-            result = WebRequest.get_response(url, params=params).json()['esearchresult']
+            result = self.request(url, params=params).json()['esearchresult']
             idlist += result['idlist']
 
         if limit:
@@ -108,46 +186,342 @@ class Eutils(object):
 
         return idlist
 
-    def efetch(self, ids, batch_size=5, **kwargs):
+    def esearch_history(self, term, retstart=0, limit=None, **kwargs):
+        """
+            https://www.ncbi.nlm.nih.gov/books/NBK25499/#chapter4.ESearch
+
+            > - store the result on the history server, no idlist is transferred
+            >> esearch.cgi?db=pubmed&term=ngs&usehistory=y&retmax=0
+
+            return: {'webenv': ..., 'query_key': ..., 'retstart': ..., 'count': ...}
+        """
+        url = self.base_url + 'esearch.fcgi'
+        params = self.parse_params(term=term, retmode='json', retmax=0, usehistory='y', **kwargs)
+        result = self.request(url, params=params).json()['esearchresult']
+
+        count = int(result['count'])
+        self.logger.info(f'\x1b[1;31m{count}\x1b[0m articles found')
+
+        count = max(count - retstart, 0)
+        if limit:
+            self.logger.info('limit {} from {}'.format(limit, count))
+            count = min(count, limit)
+
+        if not count:
+            self.logger.warning('no result for term: {}'.format(term))
+
+        return {
+            'webenv': result['webenv'],
+            'query_key': result['querykey'],
+            'retstart': retstart,
+            'count': count,
+        }
+
+    def esearch_count(self, term, mindate=None, maxdate=None, datetype='pdat', **kwargs):
+        """
+            count the records of term, optionally within a date window, or the last `reldate` days
+        """
+        if mindate and maxdate:
+            kwargs.update(mindate=mindate, maxdate=maxdate, datetype=datetype)
+        elif kwargs.get('reldate'):
+            kwargs.update(datetype=datetype)
+        return int(self.esearch(term, retmax=0, head=True, **kwargs)['count'])
+
+    def date_shards(self, term, mindate=None, maxdate=None, datetype='pdat', concurrency=1):
+        """
+            split the term into disjoint date windows, each with no more than `esearch_cap` records
+
+            windows over the cap are split with count probes recursively, the probes of
+            one level run in parallel
+
+            return a list of (mindate, maxdate, count) sorted by date
+        """
+        mindate = mindate or datetime.date(1000, 1, 1)
+        maxdate = maxdate or datetime.date(datetime.date.today().year + 1, 12, 31)
+
+        def probe(window):
+            start, end = window
+            count = self.esearch_count(term, start.strftime('%Y/%m/%d'), end.strftime('%Y/%m/%d'), datetype=datetype)
+            return start, end, count
+
+        shards = []
+        windows = [(mindate, maxdate)]
+        while windows:
+            splits = []
+            for start, end, count in bounded_map(probe, windows, workers=concurrency):
+                if not count:
+                    continue
+                days = (end - start).days + 1
+                if count <= self.esearch_cap:
+                    shards.append((start, end, count))
+                elif days == 1:
+                    self.logger.warning(f'{count} records on {start}, only the first {self.esearch_cap} can be fetched')
+                    shards.append((start, end, self.esearch_cap))
+                else:
+                    parts = min(days, count // self.esearch_cap + 2)
+                    step = days / parts
+                    bounds = [start + datetime.timedelta(days=round(step * i)) for i in range(parts)] + [end + datetime.timedelta(days=1)]
+                    splits += [(a, b - datetime.timedelta(days=1)) for a, b in zip(bounds, bounds[1:]) if a < b]
+            self.logger.debug(f'date shards: {len(shards)} done, {len(splits)} to split')
+            windows = splits
+
+        shards.sort()
+        self.logger.info('{} shards for term: {}'.format(len(shards), term))
+        return shards
+
+    def esearch_sharded(self, term, mindate=None, maxdate=None, datetype='pdat', retstart=0, limit=None, concurrency=1, **kwargs):
+        """
+            esearch beyond the cap of ESearch (retstart 9999) by date shards
+
+            return a deduplicated generator of pmids
+        """
+        url = self.base_url + 'esearch.fcgi'
+        shards = self.date_shards(term, mindate=mindate, maxdate=maxdate, datetype=datetype, concurrency=concurrency)
+
+        def shard_ids(shard):
+            start, end, _ = shard
+            params = self.parse_params(term=term, retmode='json', retmax=self.esearch_cap, datetype=datetype,
+                                       mindate=start.strftime('%Y/%m/%d'), maxdate=end.strftime('%Y/%m/%d'))
+            return self.request(url, params=params).json()['esearchresult']['idlist']
+
+        seen = set()
+        n = 0
+        for idlist in bounded_map(shard_ids, shards, workers=concurrency):
+            for pmid in idlist:
+                if pmid in seen:
+                    continue
+                seen.add(pmid)
+                n += 1
+                if n <= retstart:
+                    continue
+                yield pmid
+                if limit and n - retstart >= limit:
+                    return
+
+    def esearch_since(self, term, mindate=None, maxdate=None, reldate=None, **kwargs):
+        """
+            the ids of the term entered or revised within a date window
+
+            mindate/maxdate:    YYYY/MM/DD, maxdate is today by default
+            reldate:            the last n days, instead of mindate/maxdate
+
+            > - the new ones are searched with the entrez date, the revised ones with the modification date
+            >> esearch.cgi?db=pubmed&term=ngs&datetype=edat&mindate=2024/01/01&maxdate=2024/01/31
+            >> esearch.cgi?db=pubmed&term=ngs&datetype=mdat&reldate=7
+
+            return (new_ids, revised_ids)
+        """
+        if reldate:
+            window = {'reldate': reldate}
+        else:
+            window = {'mindate': mindate, 'maxdate': maxdate or datetime.date.today().strftime('%Y/%m/%d')}
+
+        ids = {}
+        for datetype in ('edat', 'mdat'):
+            count = self.esearch_count(term, datetype=datetype, **window)
+            if count > self.esearch_cap:
+                self.logger.warning(f'{count} records of {datetype} in the window, only the first {self.esearch_cap} are fetched')
+            ids[datetype] = self.esearch(term, retmax=self.esearch_cap, limit=self.esearch_cap, datetype=datetype, **window) if count else []
+
+        new = set(ids['edat'])
+        revised = [_id for _id in ids['mdat'] if _id not in new]
+        self.logger.info(f'{len(new)} new and {len(revised)} revised articles since {mindate or reldate}')
+        return ids['edat'], revised
+
+    def efetch(self, ids, **kwargs):
+        """
+            fetch articles for given ids, see `efetch_batches`
+        """
+        for articles in self.efetch_batches(ids, **kwargs):
+            for article in articles:
+                yield article
+
+    @classmethod
+    def parse_fields(cls, fields):
+        """
+            fields: 'pmid,title,year' or a list
+
+            return the set of fields to parse, with pmid and the sources of the enrichments,
+            None for all fields
+        """
+        if not fields:
+            return None
+
+        if isinstance(fields, str):
+            fields = fields.strip(',').split(',')
+
+        parsed = set(fields) | {'pmid'}
+        for field in fields:
+            parsed.update(cls.field_sources.get(field, ()))
+        return parsed
+
+    def efetch_batches(self, ids, batch_size=5, concurrency=1, unordered=False, fields=None, skip=None, **kwargs):
         """
             https://www.ncbi.nlm.nih.gov/books/NBK25499/#chapter4.EFetch
 
             > - fetch from a database for given ids
             >> efetch.cgi?db=pubmed&id=1,2,3
+            > - fetch from the history server, ids is the result of `esearch(term, usehistory=True)`
+            >> efetch.cgi?db=pubmed&WebEnv=xxx&query_key=1&retstart=0&retmax=500
+            > - ids can also be a generator of pmids, eg. the result of `esearch_sharded`
+
+            concurrency:    the number of batches in flight, all requests share the rate limiter
+            unordered:      yield batches as soon as they are done, instead of in input order
+            fields:         only parse the selected fields, see `parse_fields`
+            skip:           the offsets of the batches to skip, eg. the ones done before a resume
+
+            yield an `ArticleBatch` for each batch
         """
-        url = self.base_url + 'efetch.fcgi'
+        if isinstance(ids, dict):
+            batch_size = max(batch_size, self.history_batch_size)
+            total = ids['count']
+            batches = ((n, {
+                'WebEnv': ids['webenv'],
+                'query_key': ids['query_key'],
+                'retstart': ids['retstart'] + n,
+                'retmax': min(batch_size, total - n),
+            }) for n in range(0, total, batch_size))
+        elif isinstance(ids, (list, tuple)):
+            total = len(ids)
+            batches = ((n, ids[n:n+batch_size]) for n in range(0, total, batch_size))
+        else:
+            total = 'unknown'
+            batches = ((n * batch_size, chunk) for n, chunk in enumerate(chunked(ids, batch_size)))
 
-        self.logger.info('fetching start: total {}, batch_size: {}'.format(len(ids), batch_size))
+        if skip:
+            batches = ((n, batch) for n, batch in batches if n not in skip)
+            self.logger.info('skip {} batches done before'.format(len(skip)))
 
-        for n in range(0, len(ids), batch_size):
-            id_list = ids[n:n+batch_size]
-            if self.db == 'pmc' and self.convert_pmc:
-                pmid_list = []
-                for i in id_list:
-                    result = pmc_id_converter.API.idconv(f'PMC{i}')[0]
-                    pmid = result.data.get('pmid')
-                    if pmid:
-                        pmid_list.append(pmid)
-                    else:
-                        self.logger.warning(f'no pmid for pmc: {i}')
-                id_list = pmid_list
+        self.logger.info('fetching start: total {}, batch_size: {}, concurrency: {}'.format(total, batch_size, concurrency))
+
+        if self.db == 'pmc' and self.convert_pmc:
+            # convert the next batch in background while the current one is fetching
+            batches = bounded_map(self.convert_batch, batches, workers=1, max_pending=concurrency + 1)
 
-            _id = ','.join(id_list)
+        fields = self.parse_fields(fields)
 
-            self.logger.debug(f'fetching xml: {n+1} - {n+batch_size}')
-            params = self.parse_params(id=_id, retmode='xml')
+        def fetch_batch(batch):
+            # keep the offset, the batches may be out of order
+            return batch[0], self.fetch_batch(batch, fields=fields)
 
+        if concurrency > 1:
+            results = bounded_map(fetch_batch, batches, workers=concurrency, ordered=not unordered)
+        else:
+            results = map(fetch_batch, batches)
+
+        for n, contexts in results:
+            yield ArticleBatch((Article(**context) for context in contexts), offset=n)
+
+    @property
+    def use_store(self):
+        """
+            the store is keyed by pmid, so it only works for pubmed articles
+        """
+        return self.store is not None and (self.db == 'pubmed' or self.convert_pmc)
+
+    @property
+    def pmc_converter(self):
+        if self._pmc_converter is None:
+            self._pmc_converter = PMCConverter(limiter=self.limiter)
+        return self._pmc_converter
+
+    def convert_batch(self, batch):
+        """
+            convert the pmcids of a batch to pmids
+
+            batch:  (offset, pmcid_list)
+            return (offset, pmid_list)
+        """
+        n, id_list = batch
+        pmid_list = []
+        for pmcid, pmid in self.pmc_converter.convert(id_list).items():
+            if pmid:
+                pmid_list.append(pmid)
+            else:
+                self.logger.warning(f'no pmid for pmc: {pmcid}')
+        return n, pmid_list
+
+    def fetch_batch(self, batch, fields=None):
+        """
+            fetch and parse one batch of efetch
+
+            batch:  (offset, id_list) or (offset, history window)
+            fields: the set of fields to parse, None for all
+            return a list of contexts
+        """
+        n, id_list = batch
+        url = self.base_url + 'efetch.fcgi'
+        xml_parser = self.xml_parser
+
+        window = None
+        if isinstance(id_list, dict):
+            # the ids of a history window are listed only to read the stored articles
+            window, id_list = id_list, None
+            if self.use_store and not self.store.refresh:
+                id_list = self.history_ids(window)
+
+        stored = {}
+        if id_list is not None and self.use_store:
+            size = len(id_list)
+            stored = self.store.get_many(id_list)
+            if len(stored) == size:
+                self.logger.debug(f'all from store: {n+1} - {n+size}')
+                return [stored[str(_id)] for _id in id_list]
+            if stored:
+                self.logger.debug(f'{len(stored)} from store: {n+1} - {n+size}')
+
+        request_kwargs = {}
+        if window is not None and not stored:
+            size = window['retmax']
+            params = self.parse_params(retmode='xml', **window)
+        else:
+            size = len(id_list)
+            params = self.parse_params(id=','.join(_id for _id in id_list if str(_id) not in stored), retmode='xml')
+
+            # the ids were converted to pmids by `convert_batch`
             if self.db == 'pmc' and self.convert_pmc:
                 params['db'] = 'pubmed'
-                self.xml_parser = pubmed_xml_parser
-
-            xml = WebRequest.get_response(url, params=params).text
-            
-            self.logger.debug(f'parsing xml: {n+1} - {n+batch_size}')
-            for context in self.xml_parser.parse(xml):
-                
-                article = Article(**context)
-                yield article
+                xml_parser = pubmed_xml_parser
+
+            # the rest of a history window may be too long for the url
+            if window is not None:
+                request_kwargs = {'method': 'POST', 'data': params}
+                params = None
+
+        self.logger.debug(f'fetching xml: {n+1} - {n+size}')
+        xml = self.request(url, params=params, **request_kwargs).content
+
+        self.logger.debug(f'parsing xml: {n+1} - {n+size}')
+        contexts = [context for context in xml_parser.parse(xml, stream=True, fields=fields) if context]
+
+        # the partial contexts are not stored
+        if self.use_store and contexts and fields is None:
+            self.store.put_many(contexts)
+
+        if stored:
+            # merge in the order of input
+            fetched = {str(context['pmid']): context for context in contexts}
+            fetched.update(stored)
+            contexts = [fetched[str(_id)] for _id in id_list if str(_id) in fetched]
+
+        return contexts
+
+    def history_ids(self, window):
+        """
+            list the ids of a history window with `rettype=uilist`
+
+            window: the efetch params of `efetch_batches`, with WebEnv, query_key, retstart and retmax
+            return the id list, None if failed
+        """
+        params = self.parse_params(rettype='uilist', retmode='text', **window)
+        resp = self.request(self.base_url + 'efetch.fcgi', params=params)
+        if resp is None:
+            return None
+        ids = resp.text.split()
+        if not all(_id.isdigit() for _id in ids):
+            self.logger.warning('failed to list the ids of the history window: {retstart} - {retmax}'.format(**window))
+            return None
+        return ids
 
     def einfo(self, **kwargs):
         """
@@ -160,8 +534,8 @@ class Eutils(object):
         """
         url = self.base_url + 'einfo.fcgi'
         params = self.parse_params(retmode='json', **kwargs)
-        info = WebRequest.get_response(url, params=params, allowed_codes=[200, 400]).json()
-        return info
+        resp = self.request(url, params=params, allowed_codes=[200, 400])
+        return resp.json() if resp is not None else None
 
     def elink(self, ids, dbfrom='pubmed', cmd='neighbor', **kwargs):
         """
@@ -185,7 +559,13 @@ class Eutils(object):
         """
         url = self.base_url + 'elink.fcgi'
         params = self.parse_params(retmode='json', id=ids, dbfrom=dbfrom, cmd=cmd,  **kwargs)
-        result = WebRequest.get_response(url, params=params).json()
+
+        # a list of ids is sent as multiple `id=` parameters, one linkset for each id
+        # post it in case the url is too long
+        if isinstance(ids, (list, tuple)):
+            result = self.request(url, method='POST', data=params).json()
+        else:
+            result = self.request(url, params=params).json()
         return result
 
     def get_cited(self, _id, dbfrom='pubmed', cmd='neighbor'):
@@ -201,6 +581,24 @@ class Eutils(object):
         citedin = links[0] if links else []
         return {'count': len(citedin), 'links': citedin}
 
+    def get_cited_batch(self, ids, dbfrom='pubmed', cmd='neighbor'):
+        """
+            get the cited pmids for a batch of pmids with one request
+
+            return {pmid: {'count': N, 'links': [...]}}
+        """
+        ids = [str(_id) for _id in ids]
+        cited = {_id: {'count': 0, 'links': []} for _id in ids}
+        if not ids:
+            return cited
+
+        for linkset in self.elink(ids, dbfrom=dbfrom, cmd=cmd).get('linksets', []):
+            for linksetdb in linkset.get('linksetdbs', []):
+                if linksetdb['linkname'] == 'pubmed_pubmed_citedin':
+                    for _id in linkset['ids']:
+                        cited[str(_id)] = {'count': len(linksetdb['links']), 'links': linksetdb['links']}
+        return cited
+
     def get_pdf_url(self, _id, dbfrom='pubmed', cmd='prlinks'):
         """
             get the pdf url for given pmid
@@ -219,6 +617,8 @@ class Eutils(object):
 
         fieldlist = sorted(fieldlist, key=lambda x: x.get('fullname'))
 
+        import prettytable
+
         fields = {}
         table = prettytable.PrettyTable(field_names=['Number', 'Name', 'FullName', 'Description'])
         for n, each in enumerate(fieldlist, 1):
@@ -237,6 +637,8 @@ class Eutils(object):
             Description: https://www.ncbi.nlm.nih.gov/account/settings/#accountSettingsApiKeyManagement
                 - E-utils users are allowed 3 requests/second without an API key.
                 - Create an API key to increase your e-utils limit to 10 requests/second.
+
+            the result is cached for `api_key_ttl` seconds, einfo is not requested on every run
         """
         configfile = os.path.join(os.path.expanduser('~'), '.pypubmed.cfg')
 
@@ -251,48 +653,212 @@ class Eutils(object):
                 self.logger.warning(msg)
                 return
 
-        res = self.einfo()
-        if 'error' in res:
+        valid = self.cached_api_key_validation()
+        if valid is None:
+            res = self.einfo()
+            if res is None:
+                self.logger.warning('failed to validate api_key, use it anyway: {}'.format(self.api_key))
+                return
+            valid = 'error' not in res
+            self.cache_api_key_validation(valid)
+
+        if not valid:
             self.logger.warning('invalid api_key, please check: {}'.format(self.api_key))
             self.api_key = None
         else:
-            self.logger.info('Valid api_key: {}'.format(self.api_key))
-            with open(configfile, 'w') as out:
-                out.write(self.api_key)
-
-    def search(self, term, cited=True, translate=True, impact_factor=True, translate_cache=None, **kwargs):
+            self.logger.debug('Valid api_key: {}'.format(self.api_key))
+            if not os.path.isfile(configfile) or open(configfile).read().strip() != self.api_key:
+                with open(configfile, 'w') as out:
+                    out.write(self.api_key)
+
+    def load_api_key_cache(self):
+        if os.path.isfile(self.api_key_cachefile):
+            try:
+                with open(self.api_key_cachefile) as f:
+                    return json.load(f)
+            except ValueError:
+                pass
+        return {}
+
+    def cached_api_key_validation(self):
+        """
+            return the cached result of the api_key, None if not cached or expired
+        """
+        key = hashlib.sha256(self.api_key.encode()).hexdigest()
+        record = self.load_api_key_cache().get(key)
+        if record and time.time() - record['checked'] < self.api_key_ttl:
+            return record['valid']
+        return None
+
+    def cache_api_key_validation(self, valid):
+        # keyed by the hash, the api_key itself is kept in ~/.pypubmed.cfg only
+        cache = self.load_api_key_cache()
+        cache[hashlib.sha256(self.api_key.encode()).hexdigest()] = {'valid': valid, 'checked': time.time()}
+
+        dirname = os.path.dirname(self.api_key_cachefile)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+        with open(self.api_key_cachefile, 'w') as out:
+            json.dump(cache, out)
+
+    def search(self, term, cited=True, translate=True, impact_factor=True, translate_cache=None, translate_workers=4, fields=None, article_filter=None, job_journal=None, exclude=None, **kwargs):
         """
             term:
                 - string, eg. 'ngs AND disease'
                 - pmid, eg. 1,2,3
                 - file with pmid
+
+            fields: the fields to output, eg. 'pmid,title,year'
+                    the others are not parsed, and the enrichments of the fields not selected are skipped
+
+            article_filter: an `ArticleFilter`, applied before the enrichments
+
+            job_journal: a `JobJournal`, records the resolved ids and the completed batches,
+                         a resumable journal continues from the batches not done
+
+            exclude: the ids exported already, skipped when the WebEnv of a resumed job expired and the ids are resolved again
         """
-        if os.path.isfile(term):
-            idlist = open(term).read().strip().split()
-        elif all(re.match(r'^(PMC)*\d+$', each, re.I) for each in term.split(',')):
-            idlist = term.split(',')
+        fields = self.parse_fields(fields)
+        if fields is not None:
+            skipped = []
+            if cited and 'cited' not in fields:
+                cited = False
+                skipped.append('cited')
+            if impact_factor and 'impact_factor' not in fields:
+                impact_factor = False
+                skipped.append('impact_factor')
+            if translate and 'abstract_cn' not in fields:
+                translate = False
+                skipped.append('translate')
+            if skipped:
+                self.logger.debug('skip the enrichments not selected: {}'.format(', '.join(skipped)))
+
+        skip = None
+        if job_journal is not None and job_journal.resumable:
+            idlist = job_journal.resolved_ids()
+            skip = job_journal.done_offsets()
+            if article_filter:
+                article_filter.pushed.update(job_journal.get('pushed', []))
+            done, size = job_journal.done_count()
+            self.logger.info('resume the job: {} batches done, {} articles exported'.format(done, size))
+
+            if isinstance(idlist, dict) and idlist['count'] and not self.history_alive(idlist):
+                # the offsets of the done batches are lost with the WebEnv, fetch the ids not exported
+                self.logger.warning('the WebEnv of the job expired, resolve the ids again')
+                exclude = set(map(str, exclude or ()))
+                idlist = self.resolve_ids(term, article_filter=article_filter, usehistory=False, **kwargs)
+                idlist = job_journal.record_ids(_id for _id in idlist if str(_id) not in exclude)
+                skip = None
         else:
-            idlist = self.esearch(term, **kwargs)
+            idlist = self.resolve_ids(term, article_filter=article_filter, **kwargs)
+            if job_journal is not None:
+                idlist = job_journal.record_ids(idlist)
+                if article_filter:
+                    job_journal.set('pushed', sorted(article_filter.pushed))
+
+        if article_filter and fields is not None:
+            fields = fields | article_filter.fields
+
+        batches = self.efetch_batches(idlist, fields=fields, skip=skip, **kwargs)
+
+        translate = translate and self.TR_OK
+        enrichments = [name for name, enabled in (('impact_factor', impact_factor), ('cited', cited), ('translate', translate)) if enabled]
+
+        pipeline = TranslatePipeline(self.TR, workers=translate_workers, cache=translate_cache) if translate else None
+
+        if article_filter:
+            batches = self.filter_batches(batches, article_filter, cited=cited, pipeline=pipeline)
+            if article_filter.needs_factor:
+                # annotated by the filter already
+                impact_factor = False
+
+        batches = self.annotate_batches(batches, cited=cited, impact_factor=impact_factor)
+
+        if pipeline is not None:
+            # translate in background while the next batches are being fetched
+            batches = pipeline.run(batches)
+
+        for articles in batches:
+            for article in articles:
+                yield article
+
+            # all the articles of the batch were consumed
+            if job_journal is not None:
+                job_journal.mark_done(articles.offset, len(articles), enrichments)
+
+    def history_alive(self, history):
+        """
+            check if the WebEnv of a history dict is still on the history server, it expires after hours of inactivity
+        """
+        params = self.parse_params(WebEnv=history['webenv'], query_key=history['query_key'], retstart=history['retstart'],
+                                   retmax=1, rettype='uilist', retmode='text')
+        resp = self.request(self.base_url + 'efetch.fcgi', params=params, max_try=2)
+        return resp is not None and resp.text.strip()[:1].isdigit()
+
+    def resolve_ids(self, term, article_filter=None, usehistory=True, **kwargs):
+        """
+            resolve a term to the ids to fetch
+
+            return an id list, a generator of pmids for a sharded search,
+            or a history dict when `usehistory` and the ids are not needed
+        """
+        if os.path.isfile(term):
+            return open(term).read().strip().split()
+
+        if all(re.match(r'^(PMC)*\d+$', each, re.I) for each in term.split(',')):
+            return term.split(',')
+
+        if article_filter and self.db == 'pubmed':
+            term = article_filter.push_down(term)
+            self.logger.debug('term with filters: {}'.format(term))
+
+        count = self.esearch_count(term)
+        end = (kwargs.get('retstart') or 0) + (kwargs.get('limit') or count)
+        if self.db == 'pubmed' and min(end, count) > self.esearch_cap:
+            # ESearch can not page past the cap, split the term by publication date
+            return self.esearch_sharded(term, **kwargs)
+
+        # converting pmcids to pmids needs the idlist, otherwise fetch from the history server,
+        # the store is read for each window with its ids, see `fetch_batch`
+        usehistory = usehistory and not self.convert_pmc
+        return self.esearch(term, retmax=self.esearch_cap, usehistory=usehistory, **kwargs)
+
+    def filter_batches(self, batches, article_filter, cited=True, pipeline=None):
+        """
+            filter each batch of articles, the rejected ones skip the enrichments
+
+            pipeline: the `TranslatePipeline` if translate, to count the translate requests avoided
+
+            the batches are filtered in place, so the empty ones are still yielded for the journal
+        """
+        for articles in batches:
+            if article_filter.needs_factor:
+                self.IF.annotate(articles)
+
+            kept, rejected = article_filter.apply(articles)
+            if rejected:
+                # the cited of a batch is one ELink request, avoided only when the whole batch is rejected
+                if cited and not kept:
+                    article_filter.stats['avoided']['cited'] += 1
+                if pipeline is not None:
+                    article_filter.stats['avoided']['translate'] += pipeline.count_requests(articles) - pipeline.count_requests(kept)
+            articles[:] = kept
+
+            yield articles
+
+    def annotate_batches(self, batches, cited=True, impact_factor=True):
+        """
+            add impact_factor and cited to each batch of articles
+        """
+        for articles in batches:
+            if cited:
+                cited_map = self.get_cited_batch(article.pmid for article in articles)
 
-        articles = self.efetch(idlist, **kwargs)
-        for article in articles:
             if impact_factor:
-                res = None
-                if article.issn:
-                    res = self.IF.search(article.issn)
-                if not res and article.e_issn:
-                    res = self.IF.search(article.e_issn)
-                article.impact_factor = res[0]['factor'] if res else '.'
+                self.IF.annotate(articles)
 
             if cited:
-                article.cited = self.get_cited(article.pmid)
+                for article in articles:
+                    article.cited = cited_map[str(article.pmid)]
 
-            if translate and self.TR_OK:
-                if translate_cache and translate_cache.get(article.pmid):
-                    article.abstract_cn = translate_cache.get(article.pmid)
-                else:
-                    try:
-                        article.abstract_cn = self.TR.translate(article.abstract)
-                    except Exception as e:
-                        article.abstract_cn = 'translate failed'
-            yield article
+            yield articles
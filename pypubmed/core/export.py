@@ -1,33 +1,102 @@
+import os
 import json
-
-import openpyxl
-from openpyxl.utils import get_column_letter
-from openpyxl.styles import PatternFill, Font, Color, colors, Alignment, Border, Side
+import itertools
 
 from simple_loggers import SimpleLogger
 
 from pypubmed.util import safe_open
+from pypubmed.core import columnar
 
 
 class Export(object):
+    """
+        export the articles, the data is consumed lazily, so it can be a generator
+
+        - json/jl are written incrementally, and flushed every `flush_every` records
+        - a `.gz` suffix compresses the output, eg. out.jl.gz, out.json.gz
+        - `append` adds the records to an existing output, jl is appended in place,
+          the others are rewritten with the existing records into a temporary file, then replace the output
+        - `on_flush` is called after jl is flushed, the records written so far are on disk
+    """
 
     logger = SimpleLogger('Export')
 
-    def __init__(self, data, outfile='out.xlsx', outtype=None, fields=None, fillna='.', **kwargs):
+    def __init__(self, data, outfile='out.xlsx', outtype=None, fields=None, fillna='.', flush_every=1000, append=False, on_flush=None, **kwargs):
         self.outfile = outfile
-        self.outtype = outtype or outfile.split('.')[-1]
+        self.outtype = outtype or self.guess_outtype(outfile)
+        self.flush_every = flush_every
+        self.on_flush = on_flush
+        self.append = append and os.path.isfile(outfile)
+        if self.append and not self.line_oriented:
+            data = itertools.chain(self.read_records(outfile, self.outtype), data)
+        # columnar output keeps the missing values as nulls
+        self.fillna = fillna = None if self.outtype in columnar.FORMATS else fillna
+        self.count = 0
         # self.data = list(self.filter_data(data, fields)) if fields else data
-        self.data = list(self.reformat_data(data, fields=fields, fillna=fillna))
+        self.data = self.reformat_data(data, fields=fields, fillna=fillna)
+
+    @staticmethod
+    def guess_outtype(outfile):
+        if outfile.endswith('.gz'):
+            outfile = outfile[:-3]
+        return outfile.split('.')[-1]
+
+    @property
+    def line_oriented(self):
+        return self.outtype in ('jl', 'jsonlines')
+
+    @classmethod
+    def read_records(cls, outfile, outtype=None, columns=None):
+        """
+            yield the records of an exported file as dicts
+
+            columns: only read the selected columns of parquet/feather
+        """
+        outtype = outtype or cls.guess_outtype(outfile)
+
+        if outtype in columnar.FORMATS:
+            for record in columnar.iter_records(outfile, columns=columns):
+                yield record
+            return
+
+        if outtype == 'xlsx':
+            import openpyxl
+            book = openpyxl.load_workbook(outfile, read_only=True)
+            try:
+                for sheet in book.worksheets:
+                    rows = sheet.iter_rows(values_only=True)
+                    titles = next(rows, None) or ()
+                    for row in rows:
+                        yield dict(zip(titles, row))
+            finally:
+                book.close()
+            return
+
+        with safe_open(outfile, 'rt') as f:
+            if outtype == 'json':
+                records = json.load(f)
+            else:
+                records = (json.loads(line) for line in f if line.strip())
+            for record in records:
+                yield record
 
     def reformat_data(self, data, fields, fillna):
 
+        data = iter(data)
+
         if fields:
             field_list = fields.strip(',').split(',')
         else:
-            field_list = data[0].keys()
+            first = next(data, None)
+            if first is None:
+                return
+            field_list = list(first.keys())
+            data = itertools.chain([first], data)
 
+        field_set = set(field_list)
         for context in data:
-            out_ctx = {k: v or fillna for k, v in context.items() if k in field_list}
+            out_ctx = {k: v or fillna for k, v in context.items() if k in field_set}
+            self.count += 1
             yield out_ctx
 
     def filter_data(self, data, fields):
@@ -37,30 +106,33 @@ class Export(object):
             yield out_ctx
 
     def export(self):
-        if self.outtype == 'xlsx':
-            self.export_xlsx()
-        elif self.outtype == 'json':
-            self.export_json()
-        elif self.outtype in ('jl', 'jsonlines'):
-            self.export_json_lines()
-        else:
-            self.logger.error('outtype is invalid, please check!')
-            exit(1)
-        
-        self.logger.info('save file: {}'.format(self.outfile))
-
-    def write_title(self, sheet, titles, fg_color=colors.BLACK, bg_color=colors.WHITE, border=True, bold=True, width=18, size=12):
-        for col, value in enumerate(titles, 1):
-
-                w = width * 4 if value in ('abstract', 'abstract_cn') else width
-
-                sheet.column_dimensions[get_column_letter(col)].width = w
-                _ = sheet.cell(1, col, value=value)
-
-                # set cell styles
-                _.alignment = Alignment(horizontal='left',vertical='center',wrap_text=True)
-                _.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type="solid")
-                _.font = Font(bold=bold, color=fg_color, size=size)
+        outfile = self.outfile
+        if self.append and not self.line_oriented:
+            # the existing records are read while writing, write to a temporary file, then replace the output
+            dirname, basename = os.path.split(outfile)
+            self.outfile = os.path.join(dirname, '.tmp.' + basename)
+
+        try:
+            if self.outtype == 'xlsx':
+                self.export_xlsx()
+            elif self.outtype == 'json':
+                self.export_json()
+            elif self.line_oriented:
+                self.export_json_lines()
+            elif self.outtype in columnar.FORMATS:
+                self.export_columnar()
+            else:
+                self.logger.error('outtype is invalid, please check!')
+                exit(1)
+
+            if self.outfile != outfile and os.path.isfile(self.outfile):
+                os.replace(self.outfile, outfile)
+        finally:
+            if self.outfile != outfile and os.path.isfile(self.outfile):
+                os.remove(self.outfile)
+            self.outfile = outfile
+
+        self.logger.info('save file: {} [{} records]'.format(self.outfile, self.count))
 
     def add_hyperlink(self, key, value):
         """
@@ -85,13 +157,16 @@ class Export(object):
 
         return url
     
-    @property
-    def all_fields(self):
-        return '''
-            pmid title abstract abstract_cn impact_factor journal med_abbr iso_abbr pubdate pubmed_pubdate
-            pmc issn e_issn doi year pagination volume issue   
-            pub_status authors keywords pub_types cited
-        '''.split()
+    all_fields = '''
+        pmid title abstract abstract_cn impact_factor journal med_abbr iso_abbr pubdate pubmed_pubdate
+        pmc issn e_issn doi year pagination volume issue
+        pub_status authors keywords pub_types cited
+    '''.split()
+
+    field_order = {field: n for n, field in enumerate(all_fields)}
+
+    # the max rows of a sheet in Excel, including the title
+    max_rows = 1048576
 
     def sort(self, item):
         if type(item) == tuple:
@@ -99,37 +174,97 @@ class Export(object):
         else:
             k = item
 
-        if k in self.all_fields:
-            return self.all_fields.index(k)
-        else:
-            return 9999
+        return self.field_order.get(k, 9999)
 
-    def export_xlsx(self, sheet_title='Result', freeze_panes='B1'):
+    def add_styles(self, book, fg_color=None, bg_color=None, bold=True, size=12):
         """
-            PatternFill:
-            - https://openpyxl.readthedocs.io/en/latest/api/openpyxl.styles.fills.html?highlight=PatternFill
+            register the named styles once, cells refer to them by name
+
+            - title
+            - {band}_{kind}: band in (0, 1), kind in (text, link, wrap)
         """
-        book = openpyxl.Workbook()
-        sheet = book.active
+        from openpyxl.styles import PatternFill, Font, colors, Alignment, NamedStyle
+
+        fg_color = fg_color or colors.BLACK
+        bg_color = bg_color or colors.WHITE
+
+        title = NamedStyle(name='title')
+        title.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True)
+        title.fill = PatternFill(start_color=bg_color, end_color=bg_color, fill_type='solid')
+        title.font = Font(bold=bold, color=fg_color, size=size)
+        book.add_named_style(title)
 
-        # # freeze the first column
-        # sheet.freeze_panes = 'B1'
+        for band, color in enumerate(('00b3ffff', '00b3ffb3')):
+            for kind in ('text', 'link', 'wrap'):
+                style = NamedStyle(name=f'{band}_{kind}')
+                style.fill = PatternFill(start_color=color, end_color=color, fill_type='solid')
+                style.alignment = Alignment(horizontal='left', vertical='center', wrap_text=True if kind == 'wrap' else None)
+                if kind == 'link':
+                    style.font = Font(color=colors.BLUE, italic=True)
+                book.add_named_style(style)
 
-        # # freeze the first row
-        # sheet.freeze_panes = 'A2'
+    def add_sheet(self, book, title, titles, width=18, freeze_panes='B2'):
+        from openpyxl.utils import get_column_letter
+        from openpyxl.cell import WriteOnlyCell
+
+        sheet = book.create_sheet(title)
 
         # freeze the first column and the first row
-        sheet.freeze_panes = 'B2'
+        sheet.freeze_panes = freeze_panes
+
+        for col, value in enumerate(titles, 1):
+            w = width * 4 if value in ('abstract', 'abstract_cn') else width
+            sheet.column_dimensions[get_column_letter(col)].width = w
+
+        cells = []
+        for value in titles:
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.style = 'title'
+            cells.append(cell)
+        sheet.append(cells)
+
+        return sheet
 
-        sheet.title = sheet_title
+    def export_xlsx(self, sheet_title='Result'):
+        """
+            write-only workbook, the rows are streamed to disk
 
-        titles = sorted(list(self.data[0].keys()), key=self.sort)
-        self.write_title(sheet, titles)
-        
-        for row, context in enumerate(self.data, 2):
+            - the column plan and the styles are built once
+            - the rows beyond the limit of Excel roll over to new sheets: Result, Result_2, ...
 
-            color = '00b3ffb3' if row % 2 else '00b3ffff'
-            for col, (key, value) in enumerate(sorted(list(context.items()), key=self.sort), 1):
+            PatternFill:
+            - https://openpyxl.readthedocs.io/en/latest/api/openpyxl.styles.fills.html?highlight=PatternFill
+        """
+        # openpyxl is slow to import, only for xlsx output
+        import openpyxl
+        from openpyxl.cell import WriteOnlyCell
+
+        first = next(self.data, None)
+        if first is None:
+            self.logger.warning('no data to export')
+            return
+
+        book = openpyxl.Workbook(write_only=True)
+        self.add_styles(book)
+
+        titles = sorted(list(first.keys()), key=self.sort)
+        plan = [(key, 'link' if key in ('pmid', 'pmc', 'doi') else 'wrap' if key in ('abstract', 'abstract_cn') else 'text') for key in titles]
+
+        sheet_number = 1
+        sheet = self.add_sheet(book, sheet_title, titles)
+        row = 1
+
+        for context in itertools.chain([first], self.data):
+            if row >= self.max_rows:
+                sheet_number += 1
+                sheet = self.add_sheet(book, f'{sheet_title}_{sheet_number}', titles)
+                row = 1
+            row += 1
+
+            band = row % 2
+            cells = []
+            for key, kind in plan:
+                value = context.get(key, self.fillna)
                 if type(value) == list:
                     try:
                         value = ', '.join(value)
@@ -140,35 +275,49 @@ class Export(object):
                             value = str(value)
                 elif type(value) == dict:
                     value = json.dumps(value, ensure_ascii=False)
-                
+
                 try:
-                    _ = sheet.cell(row, col, value=value)
+                    cell = WriteOnlyCell(sheet, value=value)
                 except:
-                    _ = sheet.cell(row, col, value=str(value))
+                    cell = WriteOnlyCell(sheet, value=str(value))
 
-                _.fill = PatternFill(start_color=color, end_color=color, fill_type="solid")
+                if kind == 'link' and value not in ('.', None):
+                    cell.hyperlink = self.add_hyperlink(key, value)
+                    cell.style = f'{band}_link'
+                else:
+                    cell.style = f'{band}_{"text" if kind == "link" else kind}'
 
-                if key in ('pmid', 'pmc', 'doi') and value not in ('.', None):
-                    _.hyperlink = self.add_hyperlink(key, value)
-                    _.font = Font(color=colors.BLUE, italic=True)
-
-                wrap_text = None
-                if key in ('abstract', 'abstract_cn'):
-                    wrap_text = True
-                
-                _.alignment = Alignment(horizontal='left',vertical='center',wrap_text=wrap_text)
+                cells.append(cell)
+            sheet.append(cells)
 
         book.save(self.outfile)
 
+    def export_columnar(self, row_group_size=10000):
+        """
+            parquet, feather or arrow, see `pypubmed.core.columnar`
+        """
+        fmt = 'parquet' if self.outtype == 'parquet' else 'arrow'
+        columnar.write(self.data, self.outfile, fmt=fmt, row_group_size=row_group_size)
+
     def export_json(self, **kwargs):
-        with safe_open(self.outfile, 'w') as out:
-            json.dump(self.data, out, ensure_ascii=False, **kwargs)
+        with safe_open(self.outfile, 'wt') as out:
+            out.write('[')
+            for n, context in enumerate(self.data):
+                if n:
+                    out.write(', ')
+                json.dump(context, out, ensure_ascii=False, **kwargs)
+                if n % self.flush_every == 0:
+                    out.flush()
+            out.write(']')
 
     def export_json_lines(self):
-        with safe_open(self.outfile, 'w') as out:
-            for context in self.data:
+        with safe_open(self.outfile, 'at' if self.append else 'wt') as out:
+            for n, context in enumerate(self.data):
                 out.write(json.dumps(context, ensure_ascii=False) + '\n')
-
+                if n % self.flush_every == 0:
+                    out.flush()
+                    if self.on_flush:
+                        self.on_flush()
 
 if __name__ == '__main__':
     data = [
@@ -0,0 +1,105 @@
+"""
+    Impact factor lookup by ISSN/eISSN
+
+    `impact_factor.core.Factor.search` runs several sql queries for each call,
+    while a result set repeats the same few hundred journals again and again.
+    The index is built once per process from the impact factor database,
+    and optionally persisted as json, so the next processes load it directly.
+"""
+import os
+import json
+import threading
+
+from simple_loggers import SimpleLogger
+
+from pypubmed.util.cache import CACHE_DIR
+
+
+class FactorIndex(object):
+    """
+        >>> index = FactorIndex()
+        >>> index.lookup('0028-0836', '1476-4687')
+        >>> index.annotate(articles)
+    """
+    logger = SimpleLogger('FactorIndex')
+
+    def __init__(self, factor=None, cachefile=os.path.join(CACHE_DIR, 'factor.index.json')):
+        self._factor = factor
+        self.cachefile = cachefile
+        self._index = None
+        self.lock = threading.Lock()
+
+    @property
+    def factor(self):
+        if self._factor is None:
+            from impact_factor.core import Factor
+            self._factor = Factor()
+        return self._factor
+
+    @property
+    def index(self):
+        """
+            {'issn': {issn: factor}, 'eissn': {eissn: factor}}, the keys are lowercase
+        """
+        with self.lock:
+            if self._index is None:
+                self._index = self.load() or self.build()
+        return self._index
+
+    def load(self):
+        """
+            load the persisted index, if it's not older than the impact factor database
+        """
+        if not self.cachefile or not os.path.isfile(self.cachefile):
+            return None
+
+        from impact_factor import DEFAULT_DB
+        if os.path.getmtime(self.cachefile) < os.path.getmtime(DEFAULT_DB):
+            return None
+
+        with open(self.cachefile) as f:
+            return json.load(f)
+
+    def build(self):
+        from impact_factor.core.database import FactorData
+
+        index = {'issn': {}, 'eissn': {}}
+        rows = self.factor.query.with_entities(FactorData.issn, FactorData.eissn, FactorData.factor)
+        for issn, eissn, factor in rows:
+            for key, value in (('issn', issn), ('eissn', eissn)):
+                if value and value != '.':
+                    index[key].setdefault(value.lower(), factor)
+
+        self.logger.debug('built index for {} journals'.format(len(index['issn'])))
+
+        if self.cachefile:
+            dirname = os.path.dirname(self.cachefile)
+            if dirname and not os.path.exists(dirname):
+                os.makedirs(dirname, exist_ok=True)
+            with open(self.cachefile, 'w') as out:
+                json.dump(index, out)
+
+        return index
+
+    def lookup(self, *issns):
+        """
+            return the factor of the first issn found, in the same order as `Factor.search`:
+            the issn column first, then the eissn column
+        """
+        index = self.index
+        for issn in issns:
+            if not issn:
+                continue
+            issn = issn.lower()
+            for key in ('issn', 'eissn'):
+                if issn in index[key]:
+                    return index[key][issn]
+        return None
+
+    def annotate(self, articles):
+        """
+            set impact_factor for a batch of articles in one pass, None if not found
+        """
+        for article in articles:
+            article.impact_factor = self.lookup(article.issn, article.e_issn)
+        return articles
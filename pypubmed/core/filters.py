@@ -0,0 +1,165 @@
+"""
+    Declarative filters of articles
+
+    The filters run on the parsed fields, before the costly enrichments (cited, translate),
+    so the rejected articles never reach the network.
+    For a pubmed term, the year range, publication types and journals are also pushed into the ESearch term,
+    then only the impact factor is checked locally.
+"""
+import re
+from collections import Counter
+
+
+YEAR_PATTERN = re.compile(r'\d{4}')
+
+
+def publication_year(article):
+    """
+        the year of `pubdate`, the publication date matched by `[dp]` of ESearch,
+        while `year` is from the PubMed history dates
+
+        >>> publication_year(Article(pubdate='1998 Dec-1999 Jan', year=2000))
+        1998
+    """
+    match = YEAR_PATTERN.match(getattr(article, 'pubdate', None) or '')
+    if match:
+        return int(match.group())
+    return getattr(article, 'year', None)
+
+
+class ArticleFilter(object):
+    """
+        min_factor:     the minimum impact factor, articles without impact factor are kept
+        min_year:       the minimum year of publication
+        max_year:       the maximum year of publication
+        pub_types:      keep the articles with any of the publication types
+        journals:       keep the articles of any of the journals, matched with title, ISO or MEDLINE abbreviation
+
+        >>> article_filter = ArticleFilter(min_factor=5, min_year=2020, pub_types=['Review'])
+        >>> article_filter.push_down('ngs')
+        '(ngs) AND ("2020"[dp] : "3000"[dp]) AND ("review"[pt])'
+        >>> kept, rejected = article_filter.apply(articles)
+        >>> article_filter.stats
+    """
+    # the parsed fields required by each criterion
+    criteria_fields = {
+        'min_factor': ('issn', 'e_issn', 'impact_factor'),
+        'year': ('pubdate', 'year'),
+        'pub_types': ('pub_types', ),
+        'journals': ('journal', 'iso_abbr', 'med_abbr'),
+    }
+
+    def __init__(self, min_factor=None, min_year=None, max_year=None, pub_types=None, journals=None):
+        self.min_factor = min_factor
+        self.min_year = min_year
+        self.max_year = max_year
+        self.pub_types = {each.lower() for each in pub_types} if pub_types else None
+        self.journals = {each.lower() for each in journals} if journals else None
+
+        # the criteria already applied by ESearch
+        self.pushed = set()
+        self.stats = {'checked': 0, 'rejected': 0, 'rejected_by': Counter(), 'avoided': Counter()}
+
+    @property
+    def criteria(self):
+        criteria = []
+        if self.min_factor is not None:
+            criteria.append('min_factor')
+        if self.min_year is not None or self.max_year is not None:
+            criteria.append('year')
+        if self.pub_types:
+            criteria.append('pub_types')
+        if self.journals:
+            criteria.append('journals')
+        return criteria
+
+    @property
+    def local_criteria(self):
+        return [each for each in self.criteria if each not in self.pushed]
+
+    @property
+    def needs_factor(self):
+        return 'min_factor' in self.criteria
+
+    @property
+    def fields(self):
+        """
+            the fields to parse for the local criteria
+        """
+        fields = set()
+        for each in self.local_criteria:
+            fields.update(self.criteria_fields[each])
+        return fields
+
+    def __bool__(self):
+        return bool(self.criteria)
+
+    def push_down(self, term):
+        """
+            add the year range, publication types and journals to an ESearch term of pubmed
+        """
+        parts = []
+        if 'year' in self.criteria:
+            parts.append('("{}"[dp] : "{}"[dp])'.format(self.min_year or 1000, self.max_year or 3000))
+            self.pushed.add('year')
+        if 'pub_types' in self.criteria:
+            parts.append('({})'.format(' OR '.join('"{}"[pt]'.format(each) for each in sorted(self.pub_types))))
+            self.pushed.add('pub_types')
+        if 'journals' in self.criteria:
+            parts.append('({})'.format(' OR '.join('"{}"[journal]'.format(each) for each in sorted(self.journals))))
+            self.pushed.add('journals')
+
+        if not parts:
+            return term
+        return ' AND '.join(['({})'.format(term)] + parts)
+
+    def reject_reason(self, article):
+        """
+            return the first criterion rejecting the article, None if it's kept
+        """
+        for each in self.local_criteria:
+            if each == 'min_factor':
+                factor = getattr(article, 'impact_factor', None)
+                if factor is not None and factor < self.min_factor:
+                    return each
+            elif each == 'year':
+                year = publication_year(article)
+                if year is None or (self.min_year and year < self.min_year) or (self.max_year and year > self.max_year):
+                    return each
+            elif each == 'pub_types':
+                pub_types = getattr(article, 'pub_types', None) or []
+                if not any(pub_type.lower() in self.pub_types for pub_type in pub_types):
+                    return each
+            elif each == 'journals':
+                names = (getattr(article, key, None) for key in self.criteria_fields['journals'])
+                if not any(name and name.lower() in self.journals for name in names):
+                    return each
+        return None
+
+    def apply(self, articles):
+        """
+            return (kept, rejected), the rejected ones are counted in stats
+        """
+        kept, rejected = [], []
+        for article in articles:
+            reason = self.reject_reason(article)
+            if reason:
+                self.stats['rejected_by'][reason] += 1
+                rejected.append(article)
+            else:
+                kept.append(article)
+
+        self.stats['checked'] += len(articles)
+        self.stats['rejected'] += len(rejected)
+        return kept, rejected
+
+    def report(self):
+        stats = self.stats
+        text = 'filtered {checked} articles, {rejected} rejected'.format(**stats)
+        if stats['rejected_by']:
+            text += ' ({})'.format(', '.join('{}: {}'.format(k, v) for k, v in stats['rejected_by'].items()))
+        if stats['avoided']:
+            text += ', enrichment requests avoided: {}'.format(', '.join('{}: {}'.format(k, v) for k, v in stats['avoided'].items()))
+        if self.pushed:
+            text += ', pushed into the term: {}'.format(', '.join(sorted(self.pushed)))
+        return text
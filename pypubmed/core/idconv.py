@@ -0,0 +1,105 @@
+"""
+    https://www.ncbi.nlm.nih.gov/pmc/tools/id-converter-api/
+
+    > - convert up to 200 ids in one request
+    >> idconv/v1.0/?ids=PMC3531190,PMC3531191&format=json
+"""
+import re
+import time
+
+from simple_loggers import SimpleLogger
+import pmc_id_converter
+
+from pypubmed.util.cache import SqliteCache
+
+
+class IdMap(SqliteCache):
+    """
+        persistent PMCID <-> PMID <-> DOI mapping
+
+        a pmcid without pmid is stored as a negative entry (pmid is NULL)
+    """
+    default_name = 'idmap.sqlite3'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS idmap (
+            pmcid TEXT PRIMARY KEY,
+            pmid TEXT,
+            doi TEXT,
+            updated REAL
+        );
+        CREATE INDEX IF NOT EXISTS idmap_pmid ON idmap (pmid);
+    '''
+
+    def get_many(self, pmcids):
+        """
+            return {pmcid: pmid} for the cached pmcids, pmid is None for negative entries
+        """
+        sql = 'SELECT pmcid, pmid FROM idmap WHERE pmcid IN ({})'
+        return dict(self.select_many(sql, pmcids))
+
+    def set_many(self, records):
+        """
+            records: [(pmcid, pmid, doi), ...]
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO idmap VALUES (?, ?, ?, ?)',
+                                  [(pmcid, pmid, doi, now) for pmcid, pmid, doi in records])
+
+
+class PMCConverter(object):
+    """
+        convert pmcids to pmids in bulk, cached with IdMap
+
+        >>> converter = PMCConverter()
+        >>> converter.convert(['PMC3531190', '3531191'])
+        {'PMC3531190': '23193287', 'PMC3531191': '23193288'}
+    """
+    logger = SimpleLogger('PMCConverter')
+    batch_size = 200
+
+    def __init__(self, idmap=None, limiter=None):
+        self.idmap = idmap or IdMap()
+        self.limiter = limiter
+
+    @staticmethod
+    def normalize(pmcid):
+        return 'PMC' + re.sub(r'^PMC', '', str(pmcid).strip(), flags=re.I)
+
+    def convert(self, pmcids):
+        """
+            return {pmcid: pmid or None}, in the order of input
+        """
+        pmcids = [self.normalize(pmcid) for pmcid in pmcids]
+        result = self.idmap.get_many(pmcids)
+
+        misses = [pmcid for pmcid in dict.fromkeys(pmcids) if pmcid not in result]
+        if misses:
+            self.logger.debug('convert pmcids: {} cached, {} to request'.format(len(pmcids) - len(misses), len(misses)))
+
+        for n in range(0, len(misses), self.batch_size):
+            chunk = misses[n:n+self.batch_size]
+            if self.limiter:
+                self.limiter.acquire()
+
+            try:
+                response = pmc_id_converter.API.idconv(*chunk)
+            except Exception as e:
+                response = None
+                self.logger.warning('convert failed for {} pmcids: {}'.format(len(chunk), e))
+
+            # do not cache the failed requests as negative entries
+            if not response:
+                continue
+
+            converted = {}
+            for record in response:
+                pmcid = record.data.get('pmcid')
+                if pmcid:
+                    converted[pmcid] = (record.data.get('pmid'), record.data.get('doi'))
+
+            records = [(pmcid, ) + converted.get(pmcid, (None, None)) for pmcid in chunk]
+            self.idmap.set_many(records)
+            result.update((pmcid, pmid) for pmcid, pmid, _ in records)
+
+        return {pmcid: result.get(pmcid) for pmcid in pmcids}
@@ -0,0 +1,93 @@
+"""
+    Ingest the PubMed baseline and update files into the local article store
+
+    - https://ftp.ncbi.nlm.nih.gov/pubmed/baseline/
+    - https://ftp.ncbi.nlm.nih.gov/pubmed/updatefiles/
+
+    The files are parsed in parallel by a process pool, while the results are
+    applied to the store in file order, so the later updates/deletes win.
+"""
+import os
+import json
+import time
+import glob
+import multiprocessing
+from collections import defaultdict
+
+from simple_loggers import SimpleLogger
+
+from pypubmed.util import pubmed_xml_parser
+
+
+logger = SimpleLogger('Ingest')
+
+
+def list_files(paths):
+    """
+        list the xml files of given files or directories, in the order of name
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            found = glob.glob(os.path.join(path, '*.xml')) + glob.glob(os.path.join(path, '*.xml.gz'))
+            files += sorted(found, key=os.path.basename)
+        else:
+            files.append(path)
+    return files
+
+
+def parse_file(filename):
+    """
+        parse one file in a worker process
+
+        return (filename, pid, rows, deleted, elapsed)
+    """
+    start = time.time()
+    source = os.path.basename(filename)
+
+    rows = []
+    deleted = []
+    for action, value in pubmed_xml_parser.parse_update(filename):
+        if action == 'update':
+            rows.append((value['pmid'], json.dumps(value, ensure_ascii=False), source, start))
+        else:
+            deleted.append(value)
+
+    return filename, os.getpid(), rows, deleted, time.time() - start
+
+
+def ingest(files, store, jobs=None, force=False):
+    """
+        ingest files into the store
+
+        return the throughput of each worker: {pid: {'files': N, 'records': N, 'seconds': N}}
+    """
+    if not force:
+        skipped = [filename for filename in files if store.is_ingested(os.path.basename(filename))]
+        if skipped:
+            logger.info(f'skip {len(skipped)} files already ingested, use --force to ingest them again')
+        files = [filename for filename in files if filename not in skipped]
+
+    stats = defaultdict(lambda: {'files': 0, 'records': 0, 'seconds': 0})
+    if not files:
+        return stats
+
+    jobs = min(jobs or os.cpu_count() or 1, len(files))
+    logger.info(f'ingesting {len(files)} files with {jobs} workers')
+
+    with multiprocessing.Pool(jobs) as pool:
+        # imap keeps the file order, so updates and deletes are applied in sequence
+        for filename, pid, rows, deleted, elapsed in pool.imap(parse_file, files):
+            # <DeleteCitation> is at the end of an update file
+            store.put_rows(rows)
+            store.delete_many(deleted)
+            store.mark_ingested(os.path.basename(filename), len(rows), len(deleted))
+
+            stats[pid]['files'] += 1
+            stats[pid]['records'] += len(rows)
+            stats[pid]['seconds'] += elapsed
+
+            logger.debug('{}: {} records, {} deleted, {:.1f} records/s [worker {}]'.format(
+                os.path.basename(filename), len(rows), len(deleted), len(rows) / (elapsed or 1e-9), pid))
+
+    return stats
@@ -0,0 +1,161 @@
+"""
+    Job journal of a search, to resume it after an error or Ctrl-C
+
+    - meta:     the parameters of the job, and the resolved ids: a WebEnv or an id list
+    - batches:  the efetch batches whose articles were all exported, with the enrichments applied
+
+    The batches are marked done in memory, and committed only when their articles are on disk:
+    after jl is flushed, or after the other outputs are saved.
+    The journal file (`{outfile}.journal`) is created on the first commit, and removed when the job completes,
+    so a job completing at once leaves no file.
+"""
+import os
+import json
+import time
+import threading
+
+from pypubmed.util.cache import SqliteCache, CACHE_DIR
+
+
+class JobJournal(SqliteCache):
+    """
+        >>> journal = JobJournal('pubmed.xlsx.journal')
+        >>> journal.start(term='ngs', db='pubmed', batch_size=10)
+        >>> idlist = journal.record_ids(idlist)
+        >>> journal.mark_done(0, 10, ['impact_factor'])
+        >>> journal.commit()
+        >>> journal.done_offsets()
+        {0}
+    """
+    default_name = 'search.journal'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        );
+        CREATE TABLE IF NOT EXISTS ids (
+            n INTEGER PRIMARY KEY,
+            id TEXT
+        );
+        CREATE TABLE IF NOT EXISTS batches (
+            offset INTEGER PRIMARY KEY,
+            size INTEGER,
+            enrichments TEXT,
+            updated REAL
+        );
+    '''
+
+    def __init__(self, dbfile=None):
+        self.dbfile = dbfile or os.path.join(CACHE_DIR, self.default_name)
+        self.local = threading.local()
+        self.meta = {}
+        self.ids = []
+        self.pending = []
+        self.created = os.path.isfile(self.dbfile)
+        if self.created:
+            super(JobJournal, self).__init__(self.dbfile)
+            self.meta = {key: json.loads(value) for key, value in self.conn.execute('SELECT key, value FROM meta')}
+
+    def create(self):
+        """
+            create the journal file with the meta and the ids kept so far
+        """
+        super(JobJournal, self).__init__(self.dbfile)
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO meta VALUES (?, ?)', [(k, json.dumps(v)) for k, v in self.meta.items()])
+            self.conn.executemany('INSERT OR REPLACE INTO ids VALUES (?, ?)', enumerate(self.ids))
+        self.ids = []
+        self.created = True
+
+    def get(self, key, default=None):
+        return self.meta.get(key, default)
+
+    def set(self, key, value):
+        self.meta[key] = value
+        if self.created:
+            with self.conn:
+                self.conn.execute('INSERT OR REPLACE INTO meta VALUES (?, ?)', (key, json.dumps(value)))
+
+    @property
+    def resumable(self):
+        """
+            the ids of the job were resolved, and some batches were committed
+        """
+        return self.created and self.get('resolved') is not None
+
+    def start(self, **meta):
+        """
+            reset the journal for a new job
+        """
+        if self.created:
+            self.remove()
+        self.meta = dict(meta, started=time.time())
+        self.ids = []
+        self.pending = []
+
+    def record_ids(self, ids):
+        """
+            record the resolved ids, return them for efetch
+
+            - a history dict (WebEnv) is recorded as it is
+            - a list or a generator (eg. sharded esearch) is materialized, the done batches are reset
+        """
+        if isinstance(ids, dict):
+            self.set('history', ids)
+            self.set('resolved', 'history')
+            return ids
+
+        ids = list(map(str, ids))
+        if self.created:
+            with self.conn:
+                self.conn.execute('DELETE FROM ids')
+                self.conn.execute('DELETE FROM batches')
+                self.conn.executemany('INSERT INTO ids VALUES (?, ?)', enumerate(ids))
+        else:
+            self.ids = ids
+        self.pending = []
+        self.set('resolved', 'ids')
+        return ids
+
+    def resolved_ids(self):
+        """
+            return the recorded history dict or id list
+        """
+        if self.get('resolved') == 'history':
+            return self.get('history')
+        return [row[0] for row in self.conn.execute('SELECT id FROM ids ORDER BY n')]
+
+    def mark_done(self, offset, size, enrichments=()):
+        """
+            mark a batch done in memory, it's written by `commit`
+        """
+        self.pending.append((offset, size, ','.join(enrichments), time.time()))
+
+    def commit(self):
+        """
+            write the batches marked done, call it when their articles are on disk
+        """
+        if not self.pending:
+            return
+        if not self.created:
+            self.create()
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO batches VALUES (?, ?, ?, ?)', self.pending)
+        self.pending = []
+
+    def done_offsets(self):
+        if not self.created:
+            return set()
+        return {row[0] for row in self.conn.execute('SELECT offset FROM batches')}
+
+    def done_count(self):
+        if not self.created:
+            return 0, 0
+        return self.conn.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM batches').fetchone()
+
+    def remove(self):
+        self.close()
+        for suffix in ('', '-wal', '-shm'):
+            if os.path.exists(self.dbfile + suffix):
+                os.remove(self.dbfile + suffix)
+        self.created = False
@@ -0,0 +1,73 @@
+"""
+    Saved queries, rerun incrementally with `pypubmed update <name>`
+
+    Each query keeps its term, output file and search options, and the date of its last run.
+    An update only fetches the articles entered (edat) or revised (mdat) since the last run,
+    merges them into the output, and writes them into a delta file.
+"""
+import json
+import time
+
+from pypubmed.util.cache import SqliteCache
+
+
+class QueryRegistry(SqliteCache):
+    """
+        >>> registry = QueryRegistry()
+        >>> registry.save('ngs', 'ngs AND disease', outfile='ngs.jl', db='pubmed', options={'min_factor': 5})
+        >>> registry.get('ngs')['term']
+        'ngs AND disease'
+        >>> registry.mark_run('ngs', '2024/01/31', 12)
+    """
+    default_name = 'queries.sqlite3'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS queries (
+            name TEXT PRIMARY KEY,
+            term TEXT,
+            db TEXT,
+            outfile TEXT,
+            options TEXT,
+            created REAL,
+            last_date TEXT,
+            last_run REAL,
+            last_count INTEGER
+        );
+    '''
+    columns = ('name', 'term', 'db', 'outfile', 'options', 'created', 'last_date', 'last_run', 'last_count')
+
+    def save(self, name, term, outfile, db='pubmed', options=None):
+        """
+            add or replace a query, a replaced query is fetched fully in the next run
+        """
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO queries (name, term, db, outfile, options, created) VALUES (?, ?, ?, ?, ?, ?)',
+                              (name, term, db, outfile, json.dumps(options or {}), time.time()))
+
+    def to_dict(self, row):
+        query = dict(zip(self.columns, row))
+        query['options'] = json.loads(query['options'])
+        return query
+
+    def get(self, name):
+        row = self.conn.execute('SELECT {} FROM queries WHERE name = ?'.format(', '.join(self.columns)), (name, )).fetchone()
+        return self.to_dict(row) if row else None
+
+    def list(self):
+        rows = self.conn.execute('SELECT {} FROM queries ORDER BY name'.format(', '.join(self.columns)))
+        return [self.to_dict(row) for row in rows]
+
+    def remove(self, name):
+        with self.conn:
+            cursor = self.conn.execute('DELETE FROM queries WHERE name = ?', (name, ))
+        return cursor.rowcount
+
+    def mark_run(self, name, date, count):
+        """
+            date: YYYY/MM/DD, the start date of the next update
+        """
+        with self.conn:
+            self.conn.execute('UPDATE queries SET last_date = ?, last_run = ?, last_count = ? WHERE name = ?',
+                              (date, time.time(), count, name))
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM queries').fetchone()[0]
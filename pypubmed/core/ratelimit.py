@@ -0,0 +1,113 @@
+"""
+    https://www.ncbi.nlm.nih.gov/books/NBK25497/#chapter2.Usage_Guidelines_and_Requiremen
+
+    > - E-utils users are allowed 3 requests/second without an API key.
+    > - Create an API key to increase your e-utils limit to 10 requests/second.
+
+    All the requests of a process share one token bucket per api_key,
+    the rate is halved when NCBI answers with 429/5xx, and recovers slowly after successes.
+"""
+import time
+import threading
+
+from simple_loggers import SimpleLogger
+
+
+RATE_WITHOUT_KEY = 3
+RATE_WITH_KEY = 10
+
+THROTTLE_CODES = (429, 500, 502, 503, 504)
+
+
+class RateLimiter(object):
+    """
+        Token bucket rate limiter
+
+        >>> limiter = RateLimiter(rate=3)
+        >>> limiter.acquire()
+        >>> limiter.feedback(429)
+        >>> limiter.stats
+    """
+    logger = SimpleLogger('RateLimiter')
+
+    def __init__(self, rate=RATE_WITHOUT_KEY, burst=None, min_rate=0.5, recover_step=0.1):
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = min_rate
+        self.recover_step = recover_step
+        self.capacity = float(burst or 1)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+        self.stats = {'granted': 0, 'delayed': 0, 'rejected': 0, 'throttled': 0}
+
+    def set_rate(self, rate):
+        """
+            reset the ceiling, eg. after the api_key is validated
+        """
+        with self.lock:
+            self.max_rate = self.rate = float(rate)
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, blocking=True, timeout=None):
+        """
+            take one token, wait for it if blocking
+
+            return False if no token is available within timeout
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        delayed = False
+
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.stats['delayed' if delayed else 'granted'] += 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+
+                if not blocking or (deadline is not None and time.monotonic() + wait > deadline):
+                    self.stats['rejected'] += 1
+                    return False
+
+            delayed = True
+            time.sleep(wait)
+
+    def feedback(self, status_code):
+        """
+            adapt the rate with the status code of a response
+
+            - 429/5xx: multiplicative decrease
+            - others: additive increase, up to the ceiling
+        """
+        with self.lock:
+            if status_code in THROTTLE_CODES:
+                self.stats['throttled'] += 1
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+                self.logger.debug('throttled by status code {}, slow down to {:.2f} req/s'.format(status_code, self.rate))
+            elif self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.recover_step * self.max_rate)
+
+    def __repr__(self):
+        return 'RateLimiter[{:.2f}/{:.2f} req/s - {}]'.format(self.rate, self.max_rate, self.stats)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(api_key=None):
+    """
+        get the process-wide limiter for given api_key
+    """
+    with _limiters_lock:
+        if api_key not in _limiters:
+            rate = RATE_WITH_KEY if api_key else RATE_WITHOUT_KEY
+            _limiters[api_key] = RateLimiter(rate=rate)
+        return _limiters[api_key]
@@ -0,0 +1,125 @@
+"""
+    Local article store
+
+    The parsed contexts (the kwargs of `Article`) are stored as json, keyed by pmid.
+    It's filled by `pypubmed ingest` from the PubMed baseline/update files,
+    and by `efetch` with the articles fetched from NCBI.
+
+    - ttl: the fetched articles expire after ttl seconds, then they are fetched again
+    - max_records: the least recently used fetched articles are evicted beyond it
+    - the ingested articles never expire or get evicted, they are managed by the update files
+"""
+import json
+import time
+
+from pypubmed.util.cache import SqliteCache
+
+
+class ArticleStore(SqliteCache):
+    """
+        >>> store = ArticleStore('pubmed.sqlite3', ttl=7*24*3600, max_records=100000)
+        >>> store.put_many([{'pmid': 1, 'title': 'test'}], source='pubmed25n0001.xml.gz')
+        >>> store.get_many([1, 2])
+        {'1': {'pmid': 1, 'title': 'test'}}
+    """
+    default_name = 'articles.sqlite3'
+    fetched_source = 'efetch'
+    # the fetched articles are counted for eviction every `evict_interval` writes
+    evict_interval = 1000
+    schema = '''
+        CREATE TABLE IF NOT EXISTS articles (
+            pmid INTEGER PRIMARY KEY,
+            data TEXT,
+            source TEXT,
+            updated REAL,
+            accessed REAL
+        );
+        CREATE INDEX IF NOT EXISTS articles_accessed ON articles (source, accessed);
+        CREATE TABLE IF NOT EXISTS ingested (
+            filename TEXT PRIMARY KEY,
+            records INTEGER,
+            deleted INTEGER,
+            updated REAL
+        );
+    '''
+
+    def __init__(self, dbfile=None, ttl=None, max_records=None, refresh=False):
+        self.ttl = ttl
+        self.max_records = max_records
+        self.refresh = refresh
+        self.writes = 0
+        super(ArticleStore, self).__init__(dbfile)
+
+    def get_many(self, pmids):
+        """
+            return {pmid(str): context} for the stored pmids, the expired ones are excluded
+        """
+        if self.refresh:
+            return {}
+
+        sql = 'SELECT pmid, data, source, updated FROM articles WHERE pmid IN ({})'
+        expire = time.time() - self.ttl if self.ttl else None
+
+        result = {}
+        for pmid, data, source, updated in self.select_many(sql, (int(pmid) for pmid in pmids)):
+            if expire and source == self.fetched_source and updated < expire:
+                continue
+            result[str(pmid)] = json.loads(data)
+
+        if result:
+            now = time.time()
+            with self.conn:
+                self.conn.executemany('UPDATE articles SET accessed = ? WHERE pmid = ?',
+                                      [(now, int(pmid)) for pmid in result])
+        return result
+
+    def put_many(self, contexts, source=None):
+        """
+            insert or replace the contexts, the source is `efetch` by default
+        """
+        now = time.time()
+        source = source or self.fetched_source
+        rows = [(int(context['pmid']), json.dumps(context, ensure_ascii=False), source, now) for context in contexts]
+        self.put_rows(rows)
+
+        if self.max_records and source == self.fetched_source:
+            before = self.writes
+            self.writes += len(rows)
+            if self.writes // self.evict_interval != before // self.evict_interval:
+                self.evict()
+
+    def put_rows(self, rows):
+        """
+            rows: [(pmid, json_data, source, updated), ...]
+        """
+        with self.conn:
+            self.conn.executemany('INSERT OR REPLACE INTO articles VALUES (?, ?, ?, ?, ?)',
+                                  [tuple(row) + (row[3], ) for row in rows])
+
+    def evict(self):
+        """
+            evict the least recently used fetched articles beyond max_records,
+            the ingested articles are not counted
+        """
+        count = self.conn.execute('SELECT COUNT(*) FROM articles WHERE source = ?', (self.fetched_source, )).fetchone()[0]
+        if count <= self.max_records:
+            return 0
+
+        sql = 'DELETE FROM articles WHERE pmid IN (SELECT pmid FROM articles WHERE source = ? ORDER BY accessed LIMIT ?)'
+        with self.conn:
+            cursor = self.conn.execute(sql, (self.fetched_source, count - self.max_records))
+        return cursor.rowcount
+
+    def delete_many(self, pmids):
+        with self.conn:
+            self.conn.executemany('DELETE FROM articles WHERE pmid = ?', [(int(pmid), ) for pmid in pmids])
+
+    def is_ingested(self, filename):
+        return self.conn.execute('SELECT 1 FROM ingested WHERE filename = ?', (filename, )).fetchone() is not None
+
+    def mark_ingested(self, filename, records, deleted):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO ingested VALUES (?, ?, ?, ?)', (filename, records, deleted, time.time()))
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM articles').fetchone()[0]
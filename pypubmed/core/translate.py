@@ -0,0 +1,221 @@
+"""
+    Translation of abstracts
+"""
+import re
+import time
+import pickle
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from simple_loggers import SimpleLogger
+
+from pypubmed.util import safe_open
+from pypubmed.util.cache import SqliteCache
+
+
+class TranslateCache(SqliteCache):
+    """
+        translated abstracts keyed by pmid
+
+        - every entry is written when it's set, nothing is lost when a run crashes
+        - entries are read one by one, the cache is never loaded as a whole
+        - the least recently used entries are evicted beyond max_entries
+
+        >>> cache = TranslateCache(max_entries=100000)
+        >>> cache[123] = '...'
+        >>> cache.get(123)
+    """
+    default_name = 'translate.sqlite3'
+    schema = '''
+        CREATE TABLE IF NOT EXISTS translate (
+            pmid TEXT PRIMARY KEY,
+            text TEXT,
+            accessed REAL
+        );
+        CREATE INDEX IF NOT EXISTS translate_accessed ON translate (accessed);
+    '''
+    evict_interval = 1000
+
+    def __init__(self, dbfile=None, max_entries=None):
+        self.max_entries = max_entries
+        self.writes = 0
+        super(TranslateCache, self).__init__(dbfile)
+
+    def get(self, pmid, default=None):
+        row = self.conn.execute('SELECT text FROM translate WHERE pmid = ?', (str(pmid), )).fetchone()
+        if row is None:
+            return default
+
+        with self.conn:
+            self.conn.execute('UPDATE translate SET accessed = ? WHERE pmid = ?', (time.time(), str(pmid)))
+        return row[0]
+
+    def set(self, pmid, text):
+        with self.conn:
+            self.conn.execute('INSERT OR REPLACE INTO translate VALUES (?, ?, ?)', (str(pmid), text, time.time()))
+
+        self.writes += 1
+        if self.max_entries and self.writes % self.evict_interval == 0:
+            self.evict()
+
+    def evict(self):
+        """
+            evict the least recently used entries beyond max_entries
+        """
+        count = len(self)
+        if count <= self.max_entries:
+            return 0
+
+        sql = 'DELETE FROM translate WHERE pmid IN (SELECT pmid FROM translate ORDER BY accessed LIMIT ?)'
+        with self.conn:
+            cursor = self.conn.execute(sql, (count - self.max_entries, ))
+        return cursor.rowcount
+
+    def load_pickle(self, filename):
+        """
+            import the legacy pickle cache: {pmid: text}
+        """
+        with safe_open(filename, 'rb') as f:
+            data = pickle.load(f)
+
+        now = time.time()
+        with self.conn:
+            self.conn.executemany('INSERT OR IGNORE INTO translate VALUES (?, ?, ?)',
+                                  [(str(pmid), text, now) for pmid, text in data.items() if text and text != 'translate failed'])
+        return len(data)
+
+    def __getitem__(self, pmid):
+        text = self.get(pmid)
+        if text is None:
+            raise KeyError(pmid)
+        return text
+
+    def __setitem__(self, pmid, text):
+        self.set(pmid, text)
+
+    def __contains__(self, pmid):
+        return self.conn.execute('SELECT 1 FROM translate WHERE pmid = ?', (str(pmid), )).fetchone() is not None
+
+    def __len__(self):
+        return self.conn.execute('SELECT COUNT(*) FROM translate').fetchone()[0]
+
+    def __bool__(self):
+        return True
+
+
+class TranslatePipeline(object):
+    """
+        translate the abstracts of article batches in background
+
+        - several abstracts are packed into one request, up to max_chars
+        - the requests run on a pool of workers
+        - the batches are yielded in order, while the next batches are being fetched
+
+        translator: any object with a `translate(text)` method, eg. googletranslatepy.Translator
+
+        >>> class Upper(object):
+        ...     def translate(self, text):
+        ...         return text.upper()
+        >>> pipeline = TranslatePipeline(Upper(), workers=2)
+        >>> for articles in pipeline.run(batches):
+        ...     print(articles[0].abstract_cn)
+    """
+    logger = SimpleLogger('TranslatePipeline')
+    separator = '\n\n###\n\n'
+    failed = 'translate failed'
+
+    def __init__(self, translator, workers=4, max_chars=4500, cache=None, depth=2):
+        self.translator = translator
+        self.max_chars = max_chars
+        self.cache = cache
+        self.depth = depth
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+
+    def pack(self, texts):
+        """
+            pack the texts into groups, the length of each group is within max_chars
+        """
+        group, size = [], 0
+        for text in texts:
+            if group and size + len(self.separator) + len(text) > self.max_chars:
+                yield group
+                group, size = [], 0
+            group.append(text)
+            size += len(text) + len(self.separator)
+        if group:
+            yield group
+
+    def count_requests(self, articles):
+        """
+            the number of requests to translate the articles, the cached ones and the ones without abstract need none
+        """
+        texts = [article.abstract for article in articles
+                 if getattr(article, 'abstract', None) and not (self.cache and self.cache.get(article.pmid))]
+        return sum(1 for _ in self.pack(texts))
+
+    def translate_group(self, texts):
+        """
+            translate a group of texts with one request, fall back to one by one
+            if the separators are not kept by the translator
+        """
+        if len(texts) > 1:
+            result = self._translate(self.separator.join(texts))
+            if result:
+                parts = [part.strip() for part in re.split(r'\s*###\s*', result)]
+                if len(parts) == len(texts):
+                    return parts
+            self.logger.debug('unpack failed, translate {} texts one by one'.format(len(texts)))
+        return [self._translate(text) or self.failed for text in texts]
+
+    def _translate(self, text):
+        try:
+            return self.translator.translate(text)
+        except Exception as e:
+            self.logger.debug('translate failed: {}'.format(e))
+            return None
+
+    def submit(self, articles):
+        """
+            submit the articles not cached, return a list of (articles, future)
+        """
+        todo = []
+        for article in articles:
+            cached = self.cache.get(article.pmid) if self.cache else None
+            if cached:
+                article.abstract_cn = cached
+            elif not article.abstract:
+                article.abstract_cn = None
+            else:
+                todo.append(article)
+
+        futures = []
+        n = 0
+        for group in self.pack([article.abstract for article in todo]):
+            futures.append((todo[n:n+len(group)], self.executor.submit(self.translate_group, group)))
+            n += len(group)
+        return futures
+
+    @staticmethod
+    def collect(articles, futures):
+        for group, future in futures:
+            for article, text in zip(group, future.result()):
+                article.abstract_cn = text
+        return articles
+
+    def run(self, batches):
+        """
+            batches: an iterable of article lists, eg. the result of `Eutils.efetch_batches`
+
+            yield the batches in order, with `abstract_cn` filled
+        """
+        pending = deque()
+        try:
+            for articles in batches:
+                pending.append((articles, self.submit(articles)))
+                while pending and (len(pending) > self.depth or all(f.done() for _, f in pending[0][1])):
+                    yield self.collect(*pending.popleft())
+
+            while pending:
+                yield self.collect(*pending.popleft())
+        finally:
+            self.executor.shutdown(wait=False)
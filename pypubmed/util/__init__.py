@@ -14,3 +14,96 @@ def safe_open(filename, mode='r'):
     return open(filename, mode=mode)
 
 
+
+
+def bounded_map(func, iterable, workers=4, ordered=True, max_pending=None):
+    """
+        map func over iterable with a thread pool, keeping at most `max_pending` tasks submitted
+
+        - ordered: yield results in input order, otherwise as soon as they are done
+        - the iterable is consumed lazily, so it can be an endless generator
+    """
+    from collections import deque
+    from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+    max_pending = max_pending or workers * 2
+    iterator = iter(iterable)
+    executor = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+
+    def submit():
+        for item in iterator:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= max_pending:
+                break
+
+    try:
+        submit()
+        while pending:
+            if ordered:
+                future = pending.popleft()
+            else:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                future = done.pop()
+                pending.remove(future)
+            yield future.result()
+            submit()
+    finally:
+        for future in pending:
+            future.cancel()
+        executor.shutdown(wait=False)
+
+
+def chunked(iterable, size):
+    """
+        split an iterable into lists of given size lazily
+    """
+    from itertools import islice
+
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            break
+        yield chunk
+
+
+def selected(fields, *names):
+    """
+        check if any of the names is selected, all fields are selected when fields is None
+    """
+    return fields is None or any(name in fields for name in names)
+
+
+def iter_elements(source, tag):
+    """
+        parse xml incrementally with iterparse, yield each `tag` element as soon as
+        its end tag is seen, then clear it, so the memory keeps flat for big files
+
+        source:
+            - filename, `.gz` is supported
+            - xml text or bytes
+            - file-like object opened in binary mode
+    """
+    import io
+    import lxml.etree as ET
+
+    close = False
+    if isinstance(source, str) and os.path.isfile(source):
+        source = safe_open(source, 'rb')
+        close = True
+    elif isinstance(source, str):
+        source = io.BytesIO(source.encode('utf-8'))
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    try:
+        for _, elem in ET.iterparse(source, events=('end',), tag=tag, huge_tree=True):
+            yield elem
+            # clear the element and the processed siblings
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+    finally:
+        if close:
+            source.close()
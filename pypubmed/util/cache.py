@@ -0,0 +1,58 @@
+"""
+    Local caches based on sqlite3
+
+    - one database file for each cache, in `CACHE_DIR` by default
+    - one connection for each thread
+    - WAL journal mode, so several processes can share the same cache
+"""
+import os
+import sqlite3
+import threading
+
+
+CACHE_DIR = os.getenv('PYPUBMED_CACHE_DIR') or os.path.join(os.path.expanduser('~'), '.pypubmed')
+
+
+class SqliteCache(object):
+    """
+        base class of the caches, subclasses define `schema` and `default_name`
+    """
+    schema = ''
+    default_name = 'cache.sqlite3'
+
+    def __init__(self, dbfile=None):
+        self.dbfile = dbfile or os.path.join(CACHE_DIR, self.default_name)
+        dirname = os.path.dirname(self.dbfile)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname, exist_ok=True)
+
+        self.local = threading.local()
+        with self.conn:
+            self.conn.executescript(self.schema)
+
+    @property
+    def conn(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.dbfile, timeout=60)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self.local.conn = conn
+        return conn
+
+    def select_many(self, sql, keys, size=500):
+        """
+            select rows with `IN (...)` for many keys, `sql` contains a `{}` for the placeholders
+        """
+        keys = list(keys)
+        for n in range(0, len(keys), size):
+            chunk = keys[n:n+size]
+            placeholders = ','.join('?' * len(chunk))
+            for row in self.conn.execute(sql.format(placeholders), chunk):
+                yield row
+
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
@@ -1,6 +1,5 @@
 # -*- coding=utf-8 -*-
 import os
-import re
 import datetime
 from collections import defaultdict
 
@@ -9,14 +8,11 @@ try:
 except ImportError:
     import xml.etree.cElementTree as ET
 
-from w3lib import html
+from pypubmed.util import iter_elements, selected
+from pypubmed.util.text import normalize
 
 
-SPECIAL_CHARS = {
-    u'\u2009': ' ',
-    u'\u202f': ' ',
-    u'\u2217': '*',
-}
+AUTHOR_FIELDS = ('authors', 'author_records', 'affiliations', 'author_mail', 'author_first', 'author_last')
 
 
 def parse_abstract(abstracts):
@@ -54,33 +50,29 @@ def parse_abstract(abstracts):
         else:
             abstract = '\n'.join(''.join(part.itertext()) for part in abstracts)
 
-    # ===========
-    # remove tags
-    # ===========
-    abstract = html.remove_tags(abstract)
-
-    # ===============
-    # repalce entities
-    # ===============
-    n = 0
-    while re.search(r'&.{1,7};', abstract):
-        abstract = html.replace_entities(abstract)
-        n += 1
-        if n > 4:
-            print('entities levels > 5')
-            print(re.findall(r'&.{1,7};', abstract))
-            break
+    return normalize(abstract)
 
-    # =====================
-    # replace special chars
-    # =====================
-    for special, replace in SPECIAL_CHARS.items():
-        abstract = abstract.replace(special, replace)
 
-    return abstract
+def parse(xml, stream=False, fields=None):
+    """
+        xml:
+            - filename
+            - xml text or bytes
+            - file-like object (stream mode only)
 
+        stream: parse incrementally, each <article> is yielded as soon as its end tag is seen,
+                the memory keeps flat regardless of the file size, `.gz` file is supported
 
-def parse(xml):
+        fields: the selected fields, the expensive sections not selected are skipped, see `parse_article`
+    """
+    if stream:
+        found = False
+        for article in iter_elements(xml, 'article'):
+            found = True
+            yield parse_article(article, fields=fields)
+        if not found:
+            yield None
+        return
 
     if os.path.isfile(xml):
         tree = ET.parse(xml)
@@ -91,126 +83,147 @@ def parse(xml):
         yield None
     else:
         for article in tree.iterfind('article'):
-            context = {}
-
-            front = article.find('front')
-            article_meta = front.find('article-meta')
-            journal_meta = front.find('journal-meta')
-            
-            context['pmc'] = 'PMC' + article_meta.findtext('article-id[@pub-id-type="pmc"]')
-            context['doi'] = article_meta.findtext('article-id[@pub-id-type="doi"]')
-            context['pmid'] = article_meta.findtext('article-id[@pub-id-type="pmid"]')
-            # print(context['pmc'])
-
-            issn = journal_meta.find('issn[@pub-type="ppub"]')
-            if issn is None:
-                issn = journal_meta.find('issn')
-            e_issn = journal_meta.find('issn[@pub-type="epub"]')
-            if e_issn is None:
-                e_issn = journal_meta.find('issn')
-
-            context['e_issn'] = e_issn.text if e_issn is not None else '.'
-            context['issn'] = issn.text if issn is not None else '.'
-
-            article_title = article_meta.find('title-group/article-title')
-            context['title'] = ''.join(article_title.itertext()).strip().replace('\n', ' ')
-
-            context['journal'] = journal_meta.findtext('journal-title-group/journal-title')
-            context['iso_abbr'] = journal_meta.findtext('journal-id[@journal-id-type="iso-abbrev"]')
-            context['med_abbr'] = journal_meta.findtext('journal-id[@journal-id-type="nlm-ta"]')
-
-            pub_date_path_list = [
-                'pub-date[@pub-type="epub"]', 
-                'pub-date[@date-type="pub"]', 
-                'pub-date[@pub-type="pmc-release"]',    
-                'pub-date[@pub-type="ppub"]', 
-            ]
-            for pub_date_path in pub_date_path_list:
-                pubdate = article_meta.find(pub_date_path)
-                if pubdate is not None:
-                    break
-          
-            if pubdate is not None:
-                year = pubdate.findtext('year')
-                month = pubdate.findtext('month') or '1'
-                day = pubdate.findtext('day') or '1'
-            else:
-                pub_date = article_meta.find('pub-date')
-                year = pub_date.findtext('year')
-                month = pub_date.findtext('month') or '1'
-                day = pub_date.findtext('day') or '1'
-
-            context['year'] = year
-            context['pubdate'] = datetime.datetime(int(year), int(month), int(day)).strftime('%Y/%m/%d')
-            context['pubmed_pubdate'] = context['pubdate']
-
-            context['pagination'] = article_meta.findtext('elocation-id')
-            context['volume'] = article_meta.findtext('volume')
-            context['issue'] = article_meta.findtext('issue')
-
-            context['keywords'] = article_meta.xpath('kwd-group/kwd/text()')
-            context['pub_status'] = '.' # do not know which field to use
-
-            context['abstract'] = parse_abstract(article_meta.findall('abstract'))
-
-            context['pub_types'] = []  # do not know which field to use
-
-            # author emails
-            cor_email_map = {}
-            cor_list = article_meta.findall('author-notes/corresp')
-            for cor in cor_list:
-                cor_id = cor.attrib.get('id')
-                if cor_id:
-                    email = cor.findtext('email')
-                    cor_email_map[cor_id] = email
-
-            # authors
-            author_list = []
-            author_mail = []
-            aff_author_map = defaultdict(list)
-            for author in article_meta.findall('contrib-group/contrib[@contrib-type="author"]'):
-                last_name = author.findtext('name/surname')
-                fore_name = author.findtext('name/given-names')
-                author_name = ' '.join(name for name in [fore_name, last_name] if name)
-                author_list.append(author_name)
-
-                for aff in author.findall('xref[@ref-type="aff"]'):
-                    aff_id = aff.attrib['rid']
-                    aff_author_map[aff_id].append(author_name)
-
-                for cor in author.findall('xref[@ref-type="other"]'):
-                    cor_id = cor.attrib['rid']
-                    email = cor_email_map.get(cor_id)
-                    if email:
-                        mail = '{}: {}'.format(author_name, email)
-                        author_mail.append(mail)
-
-            context['authors'] = '\n'.join(author_list)
-
-            context['author_mail'] = '.'
-            if not author_mail:
-                corresp = article_meta.find('author-notes/corresp')
-                if corresp is not None:
-                    context['author_mail'] = ''.join(corresp.itertext()).strip()
-            else:
-                context['author_mail'] = '\n'.join(author_mail)
+            yield parse_article(article, fields=fields)
 
-            context['author_first'] = context['author_last'] = '.'
-            if author_list:
-                context['author_first'] = author_list[0]
-                if len(author_list) > 1:
-                    context['author_last'] = author_list[-1]
 
-            # affiliations
-            aff_list = []
-            for n, aff in enumerate(article_meta.findall('contrib-group/aff'), 1):
-                aff_text = ''.join(aff.itertext()).replace('\n', ' ')[1:]
-                aff_authors = aff_author_map.get(aff.attrib['id'])
-                aff_list.append(f'{n}. {aff_text} - {aff_authors}')
-            context['affiliations'] = '\n'.join(aff_list)
+def parse_article(article, fields=None):
+    """
+        parse one <article> element to a context dict
 
-            yield context
+        fields: the selected fields, the abstract and the authors are not parsed if not selected
+    """
+    context = {}
 
+    front = article.find('front')
+    article_meta = front.find('article-meta')
+    journal_meta = front.find('journal-meta')
+    
+    context['pmc'] = 'PMC' + article_meta.findtext('article-id[@pub-id-type="pmc"]')
+    context['doi'] = article_meta.findtext('article-id[@pub-id-type="doi"]')
+    context['pmid'] = article_meta.findtext('article-id[@pub-id-type="pmid"]')
+    # print(context['pmc'])
+
+    issn = journal_meta.find('issn[@pub-type="ppub"]')
+    if issn is None:
+        issn = journal_meta.find('issn')
+    e_issn = journal_meta.find('issn[@pub-type="epub"]')
+    if e_issn is None:
+        e_issn = journal_meta.find('issn')
+
+    context['e_issn'] = e_issn.text if e_issn is not None else '.'
+    context['issn'] = issn.text if issn is not None else '.'
+
+    article_title = article_meta.find('title-group/article-title')
+    context['title'] = ''.join(article_title.itertext()).strip().replace('\n', ' ')
+
+    context['journal'] = journal_meta.findtext('journal-title-group/journal-title')
+    context['iso_abbr'] = journal_meta.findtext('journal-id[@journal-id-type="iso-abbrev"]')
+    context['med_abbr'] = journal_meta.findtext('journal-id[@journal-id-type="nlm-ta"]')
+
+    pub_date_path_list = [
+        'pub-date[@pub-type="epub"]', 
+        'pub-date[@date-type="pub"]', 
+        'pub-date[@pub-type="pmc-release"]',    
+        'pub-date[@pub-type="ppub"]', 
+    ]
+    for pub_date_path in pub_date_path_list:
+        pubdate = article_meta.find(pub_date_path)
+        if pubdate is not None:
+            break
+
+    if pubdate is not None:
+        year = pubdate.findtext('year')
+        month = pubdate.findtext('month') or '1'
+        day = pubdate.findtext('day') or '1'
+    else:
+        pub_date = article_meta.find('pub-date')
+        year = pub_date.findtext('year')
+        month = pub_date.findtext('month') or '1'
+        day = pub_date.findtext('day') or '1'
+
+    context['year'] = year
+    context['pubdate'] = datetime.datetime(int(year), int(month), int(day)).strftime('%Y/%m/%d')
+    context['pubmed_pubdate'] = context['pubdate']
+
+    context['pagination'] = article_meta.findtext('elocation-id')
+    context['volume'] = article_meta.findtext('volume')
+    context['issue'] = article_meta.findtext('issue')
+
+    context['keywords'] = article_meta.xpath('kwd-group/kwd/text()')
+    context['pub_status'] = '.' # do not know which field to use
+
+    # the abstract is also the source of abstract_cn
+    if selected(fields, 'abstract', 'abstract_cn'):
+        context['abstract'] = parse_abstract(article_meta.findall('abstract'))
+
+    context['pub_types'] = []  # do not know which field to use
+
+    if selected(fields, *AUTHOR_FIELDS):
+        # author emails
+        cor_email_map = {}
+        cor_list = article_meta.findall('author-notes/corresp')
+        for cor in cor_list:
+            cor_id = cor.attrib.get('id')
+            if cor_id:
+                email = cor.findtext('email')
+                cor_email_map[cor_id] = email
+
+        # authors
+        author_list = []
+        author_mail = []
+        # [surname, given-names, initials] or [collab]
+        author_records = []
+        aff_author_map = defaultdict(list)
+        for author in article_meta.findall('contrib-group/contrib[@contrib-type="author"]'):
+            last_name = author.findtext('name/surname')
+            fore_name = author.findtext('name/given-names')
+            author_name = ' '.join(name for name in [fore_name, last_name] if name)
+            author_list.append(author_name)
+
+            collab = author.find('collab')
+            if last_name is None and collab is not None:
+                author_records.append([''.join(collab.itertext()).strip()])
+            else:
+                initials = ''.join(part[0] for part in (fore_name or '').replace('-', ' ').replace('.', ' ').split())
+                author_records.append([last_name or '', fore_name or '', initials])
+
+            for aff in author.findall('xref[@ref-type="aff"]'):
+                aff_id = aff.attrib['rid']
+                aff_author_map[aff_id].append(author_name)
+
+            for cor in author.findall('xref[@ref-type="other"]'):
+                cor_id = cor.attrib['rid']
+                email = cor_email_map.get(cor_id)
+                if email:
+                    mail = '{}: {}'.format(author_name, email)
+                    author_mail.append(mail)
+
+        context['authors'] = '\n'.join(author_list)
+        context['author_records'] = author_records
+
+        context['author_mail'] = '.'
+        if not author_mail:
+            corresp = article_meta.find('author-notes/corresp')
+            if corresp is not None:
+                context['author_mail'] = ''.join(corresp.itertext()).strip()
+        else:
+            context['author_mail'] = '\n'.join(author_mail)
+
+        context['author_first'] = context['author_last'] = '.'
+        if author_list:
+            context['author_first'] = author_list[0]
+            if len(author_list) > 1:
+                context['author_last'] = author_list[-1]
+
+        # affiliations
+        aff_list = []
+        for n, aff in enumerate(article_meta.findall('contrib-group/aff'), 1):
+            aff_text = ''.join(aff.itertext()).replace('\n', ' ')[1:]
+            aff_authors = aff_author_map.get(aff.attrib['id'])
+            aff_list.append(f'{n}. {aff_text} - {aff_authors}')
+        context['affiliations'] = '\n'.join(aff_list)
+
+    return context
 
 if __name__ == '__main__':
     import json
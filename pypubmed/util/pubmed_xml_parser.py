@@ -9,14 +9,8 @@ try:
 except ImportError:
     import xml.etree.cElementTree as ET
 
-from w3lib import html
-
-
-SPECIAL_CHARS = {
-    u'\u2009': ' ',
-    u'\u202f': ' ',
-    u'\u2217': '*',
-}
+from pypubmed.util import iter_elements, selected
+from pypubmed.util.text import normalize
 
 
 def parse_abstract(AbstractTexts):
@@ -44,33 +38,29 @@ def parse_abstract(AbstractTexts):
                 abstracts.append(text)
         abstract = '\n'.join(abstracts)
 
-    # ===========
-    # remove tags
-    # ===========
-    abstract = html.remove_tags(abstract)
-
-    # ===============
-    # repalce entities
-    # ===============
-    n = 0
-    while re.search(r'&.{1,7};', abstract):
-        abstract = html.replace_entities(abstract)
-        n += 1
-        if n > 4:
-            print('entities levels > 5')
-            print(re.findall(r'&.{1,7};', abstract))
-            break
+    return normalize(abstract)
 
-    # =====================
-    # replace special chars
-    # =====================
-    for special, replace in SPECIAL_CHARS.items():
-        abstract = abstract.replace(special, replace)
 
-    return abstract
+def parse(xml, stream=False, fields=None):
+    """
+        xml:
+            - filename
+            - xml text or bytes
+            - file-like object (stream mode only)
 
+        stream: parse incrementally, each <PubmedArticle> is yielded as soon as its end tag is seen,
+                the memory keeps flat regardless of the file size, `.gz` file is supported
 
-def parse(xml):
+        fields: the selected fields, the expensive sections not selected are skipped, see `parse_article`
+    """
+    if stream:
+        found = False
+        for PubmedArticle in iter_elements(xml, 'PubmedArticle'):
+            found = True
+            yield parse_article(PubmedArticle, fields=fields)
+        if not found:
+            yield None
+        return
 
     if os.path.isfile(xml):
         tree = ET.parse(xml)
@@ -81,95 +71,207 @@ def parse(xml):
         yield None
     else:
         for PubmedArticle in tree.iterfind('PubmedArticle'):
-            context = {}
-            MedlineCitation = PubmedArticle.find('MedlineCitation')
-            Article = MedlineCitation.find('Article')
+            yield parse_article(PubmedArticle, fields=fields)
+
+
+# ==========================================================
+# the xpaths are compiled once, and return plain str results
+# ==========================================================
+def _xpath(path):
+    return ET.XPath(path, smart_strings=False)
+
+
+XPATH = {
+    'MedlineCitation': _xpath('MedlineCitation'),
+    'Article': _xpath('Article'),
+    'PMID': _xpath('PMID'),
+    'e_issn': _xpath('Journal/ISSN[@IssnType="Electronic"]'),
+    'issn': _xpath('Journal/ISSN[@IssnType="Print"]'),
+    'issn_linking': _xpath('MedlineJournalInfo/ISSNLinking'),
+    'journal': _xpath('Journal/Title'),
+    'iso_abbr': _xpath('Journal/ISOAbbreviation'),
+    'med_abbr': _xpath('MedlineJournalInfo/MedlineTA'),
+    'pubdate': _xpath('Journal/JournalIssue/PubDate/*/text()'),
+    'pubmed_pubdate': _xpath('PubmedData/History/PubMedPubDate[@PubStatus=$status]/*/text()'),
+    'pagination': _xpath('Pagination/MedlinePgn'),
+    'volume': _xpath('Journal/JournalIssue/Volume'),
+    'issue': _xpath('Journal/JournalIssue/Issue'),
+    'title': _xpath('ArticleTitle'),
+    'keywords': _xpath('KeywordList/Keyword/text()'),
+    'pub_status': _xpath('PubmedData/PublicationStatus'),
+    'abstract': _xpath('Abstract/AbstractText'),
+    'authors': _xpath('AuthorList/Author'),
+    'pub_types': _xpath('PublicationTypeList/PublicationType/text()'),
+    'doi': _xpath('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]'),
+    'pmc': _xpath('PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]'),
+}
 
-            context['pmid'] = int(MedlineCitation.findtext('PMID'))
+AUTHOR_FIELDS = ('authors', 'author_records', 'affiliations', 'author_mail', 'author_first', 'author_last')
 
-            context['e_issn'] = Article.findtext('Journal/ISSN[@IssnType="Electronic"]')
-            context['issn'] = Article.findtext('Journal/ISSN[@IssnType="Print"]') or MedlineCitation.findtext('MedlineJournalInfo/ISSNLinking')
+MAIL_PATTERN = re.compile(r'([^\s]+?@.+)\.')
 
-            context['journal'] = Article.findtext('Journal/Title')
-            context['iso_abbr'] = Article.findtext('Journal/ISOAbbreviation')
 
-            context['med_abbr'] = MedlineCitation.findtext('MedlineJournalInfo/MedlineTA')
+def findtext(elem, name):
+    """
+        same as `elem.findtext(path)`: None if not found, '' if the element has no text
+    """
+    found = XPATH[name](elem)
+    if not found:
+        return None
+    return found[0].text or ''
 
-            context['pubdate'] = ' '.join(Article.xpath('Journal/JournalIssue/PubDate/*/text()'))
 
-            pubmed_pubdate = year = ''
-            for status in ('pubmed', 'entrez', 'medline'):
-                ymd = PubmedArticle.xpath('PubmedData/History/PubMedPubDate[@PubStatus="{}"]/*/text()'.format(status))
-                if ymd:
-                    pubmed_pubdate = datetime.datetime(*map(int, ymd))
-                    year = pubmed_pubdate.year
-                    pubmed_pubdate = pubmed_pubdate.strftime('%Y/%m/%d')
-                    break
+def text_nodes(elem):
+    """
+        same as `elem.xpath('text()')`: the text and the tails of the children, empty ones excluded
+    """
+    texts = [elem.text] if elem.text else []
+    texts.extend(child.tail for child in elem if child.tail)
+    return texts
 
-            context['year'] = year
-            context['pubmed_pubdate'] = pubmed_pubdate
 
-            context['pagination'] = Article.findtext('Pagination/MedlinePgn')
-            context['volume'] = Article.findtext('Journal/JournalIssue/Volume')
-            context['issue'] = Article.findtext('Journal/JournalIssue/Issue')
-            context['title'] = ''.join(Article.find('ArticleTitle').itertext())
-            context['keywords'] = MedlineCitation.xpath('KeywordList/Keyword/text()')
-            context['pub_status'] = PubmedArticle.findtext('PubmedData/PublicationStatus')
+def parse_article(PubmedArticle, fields=None):
+    """
+        parse one <PubmedArticle> element to a context dict
 
-            context['abstract'] = parse_abstract(Article.xpath('Abstract/AbstractText'))
-            
-            author_mail = []
+        fields: the selected fields, the abstract and the authors are not parsed if not selected
+    """
+    context = {}
+    MedlineCitation = XPATH['MedlineCitation'](PubmedArticle)[0]
+    Article = XPATH['Article'](MedlineCitation)[0]
 
-            author_list = []
-            affiliation_author_map = defaultdict(list)
-            for author in Article.xpath('AuthorList/Author'):
+    context['pmid'] = int(findtext(MedlineCitation, 'PMID'))
 
-                last_name = author.findtext('LastName')
-                fore_name = author.findtext('ForeName')
-                # Initials = author.findtext('Initials')
+    context['e_issn'] = findtext(Article, 'e_issn')
+    context['issn'] = findtext(Article, 'issn') or findtext(MedlineCitation, 'issn_linking')
 
-                author_name = ' '.join(name for name in [fore_name, last_name] if name)
-        
-                author_list.append(author_name)
+    context['journal'] = findtext(Article, 'journal')
+    context['iso_abbr'] = findtext(Article, 'iso_abbr')
 
-                for aff in author.xpath('AffiliationInfo/Affiliation/text()'):
-                    affiliation_author_map[aff].append(author_name)
+    context['med_abbr'] = findtext(MedlineCitation, 'med_abbr')
 
-                affiliation_info = '\n'.join(author.xpath('AffiliationInfo/Affiliation/text()'))
-                mail = re.findall(r'([^\s]+?@.+)\.', str(affiliation_info))
-                if mail:
-                    mail = '{}: {}'.format(author_name, mail[0])
-                    author_mail.append(mail)
+    context['pubdate'] = ' '.join(XPATH['pubdate'](Article))
 
-            context['author_mail'] = '\n'.join(author_mail) or '.'
-            authors = Article.xpath('AuthorList/Author/AffiliationInfo/Affiliation/text()')
-            context['author_first'] = context['author_last'] = '.'
-            if authors:
-                context['author_first'] = authors[0]
-                if len(authors) > 1:
-                    context['author_last'] = authors[-1]
+    pubmed_pubdate = year = ''
+    for status in ('pubmed', 'entrez', 'medline'):
+        ymd = XPATH['pubmed_pubdate'](PubmedArticle, status=status)
+        if ymd:
+            pubmed_pubdate = datetime.datetime(*map(int, ymd))
+            year = pubmed_pubdate.year
+            pubmed_pubdate = pubmed_pubdate.strftime('%Y/%m/%d')
+            break
 
-            context['authors'] = '\n'.join(author_list)
+    context['year'] = year
+    context['pubmed_pubdate'] = pubmed_pubdate
+
+    context['pagination'] = findtext(Article, 'pagination')
+    context['volume'] = findtext(Article, 'volume')
+    context['issue'] = findtext(Article, 'issue')
+    context['title'] = ''.join(XPATH['title'](Article)[0].itertext())
+    context['keywords'] = XPATH['keywords'](MedlineCitation)
+    context['pub_status'] = findtext(PubmedArticle, 'pub_status')
+
+    # the abstract is also the source of abstract_cn
+    if selected(fields, 'abstract', 'abstract_cn'):
+        context['abstract'] = parse_abstract(XPATH['abstract'](Article))
+
+    if selected(fields, *AUTHOR_FIELDS):
+        with_mail = selected(fields, 'author_mail')
+        with_records = selected(fields, 'author_records')
+        # ===================================================
+        # walk the authors once: names, mails and affiliations
+        # ===================================================
+        author_mail = []
+        author_list = []
+        # [LastName, ForeName, Initials] or [CollectiveName]
+        author_records = []
+        affiliations = []
+        affiliation_author_map = defaultdict(list)
+        # the consortium papers repeat the same affiliations, match the mail once for each
+        mail_map = {}
+        for author in XPATH['authors'](Article):
+
+            last_name = fore_name = initials = collective_name = None
+            author_affiliations = []
+            for child in author:
+                if child.tag == 'LastName' and last_name is None:
+                    last_name = child.text or ''
+                elif child.tag == 'ForeName' and fore_name is None:
+                    fore_name = child.text or ''
+                elif child.tag == 'Initials' and initials is None:
+                    initials = child.text or ''
+                elif child.tag == 'CollectiveName' and collective_name is None:
+                    collective_name = ''.join(child.itertext()).strip()
+                elif child.tag == 'AffiliationInfo':
+                    for aff in child.iterchildren('Affiliation'):
+                        author_affiliations.extend(text_nodes(aff))
+
+            author_name = ' '.join(name for name in [fore_name, last_name] if name)
+
+            author_list.append(author_name)
+
+            if with_records:
+                if last_name is None and collective_name:
+                    author_records.append([collective_name])
+                else:
+                    author_records.append([last_name or '', fore_name or '', initials or ''])
+
+            for aff in author_affiliations:
+                affiliation_author_map[aff].append(author_name)
+            affiliations.extend(author_affiliations)
+
+            if not with_mail:
+                continue
+
+            affiliation_info = '\n'.join(author_affiliations)
+            if affiliation_info not in mail_map:
+                mail_map[affiliation_info] = MAIL_PATTERN.findall(affiliation_info) if '@' in affiliation_info else None
+            mail = mail_map[affiliation_info]
+            if mail:
+                mail = '{}: {}'.format(author_name, mail[0])
+                author_mail.append(mail)
+
+        if with_mail:
+            context['author_mail'] = '\n'.join(author_mail) or '.'
+        context['author_first'] = context['author_last'] = '.'
+        if affiliations:
+            context['author_first'] = affiliations[0]
+            if len(affiliations) > 1:
+                context['author_last'] = affiliations[-1]
+
+        context['authors'] = '\n'.join(author_list)
+        if with_records:
+            context['author_records'] = author_records
+
+        # affiliation list, unique and in order
+        if selected(fields, 'affiliations'):
+            context['affiliations'] = '\n'.join((
+                f'{n}. {aff} - {affiliation_author_map.get(aff)}'
+                for n, aff in enumerate(dict.fromkeys(affiliations), 1)
+            ))
 
-            # affiliation list
-            affiliations = Article.xpath('AuthorList/Author/AffiliationInfo/Affiliation/text()')
+    context['pub_types'] = XPATH['pub_types'](Article)
+    context['doi'] = findtext(PubmedArticle, 'doi')
+    context['pmc'] = findtext(PubmedArticle, 'pmc')
 
-            affiliation_unique_list = []
-            for aff in affiliations:
-                if aff not in affiliation_unique_list:
-                    affiliation_unique_list.append(aff)
+    return context
 
-            context['affiliations'] = '\n'.join((
-                f'{n}. {aff} - {affiliation_author_map.get(aff)}' 
-                for n, aff in enumerate(affiliation_unique_list, 1)
-            ))
 
-            context['pub_types'] = Article.xpath('PublicationTypeList/PublicationType/text()')
-            context['doi'] = PubmedArticle.findtext('PubmedData/ArticleIdList/ArticleId[@IdType="doi"]')
-            context['pmc'] = PubmedArticle.findtext('PubmedData/ArticleIdList/ArticleId[@IdType="pmc"]')
+def parse_update(xml):
+    """
+        parse a baseline/update file incrementally, in document order
 
-            yield context
+        - yield ('update', context) for each <PubmedArticle>
+        - yield ('delete', pmid) for each <DeleteCitation>/<PMID>
 
+        https://www.nlm.nih.gov/databases/download/pubmed_medline.html
+    """
+    for elem in iter_elements(xml, ('PubmedArticle', 'DeleteCitation')):
+        if elem.tag == 'PubmedArticle':
+            yield 'update', parse_article(elem)
+        else:
+            for pmid in elem.iterfind('PMID'):
+                yield 'delete', int(pmid.text)
 
 if __name__ == '__main__':
     import json
@@ -0,0 +1,65 @@
+"""
+    Text normalization of the abstracts, shared by the parsers
+
+    * remove tags
+    * replace entities, the nested ones are decoded level by level, up to `max_levels`
+    * replace special chars
+
+    each step returns early when the text has nothing to do for it, which is the case of most abstracts
+"""
+import re
+
+from w3lib import html
+
+
+SPECIAL_CHARS = {
+    u'\u2009': ' ',
+    u'\u202f': ' ',
+    u'\u2217': '*',
+}
+
+ENTITY_PATTERN = re.compile(r'&.{1,7};')
+
+
+def remove_tags(text):
+    if '<' not in text:
+        return text
+    return html.remove_tags(text)
+
+
+def replace_entities(text, max_levels=5):
+    """
+        decode the entities until none is left, eg. `&amp;amp;` => `&amp;` => `&`
+
+        stop early when a level changes nothing, the remaining ones are not decodable
+    """
+    if '&' not in text:
+        return text
+
+    for _ in range(max_levels):
+        if not ENTITY_PATTERN.search(text):
+            break
+        decoded = html.replace_entities(text)
+        if decoded == text:
+            break
+        text = decoded
+
+    return text
+
+
+def replace_special_chars(text):
+    # str.replace is much faster than str.translate with a mapping table in CPython
+    if text.isascii():
+        return text
+    for special, replace in SPECIAL_CHARS.items():
+        if special in text:
+            text = text.replace(special, replace)
+    return text
+
+
+def normalize(text):
+    """
+        >>> normalize('<i>p</i> &amp;lt; 0.05 mg')
+        'p < 0.05 mg'
+    """
+    return replace_special_chars(replace_entities(remove_tags(text)))
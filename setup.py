@@ -24,6 +24,7 @@ setup(
     },
     license='BSD License',
     install_requires=codecs.open(os.path.join(BASE_DIR, 'requirements.txt'), encoding='utf-8').read().split('\n'),
+    extras_require={'arrow': ['pyarrow']},
     packages=find_packages(),
     include_package_data=True,
     entry_points={'console_scripts': [